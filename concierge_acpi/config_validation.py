@@ -4,6 +4,11 @@
 
 from typing import Any, Dict, List
 
+try:
+    from task_executor_helper import mac_is_valid
+except ImportError:
+    pass
+
 def validate_config_schema(config_data: Any) -> None:
     if isinstance(config_data, list):
         _validate_hosts_array(config_data)
@@ -37,8 +42,7 @@ def _validate_host(host, idx: int):
     if "mac" in host:
         if not isinstance(host["mac"], str):
             raise ValueError(f"Host {host['hostname']} mac must be a string")
-        mac_clean = host["mac"].replace(":", "").replace("-", "")
-        if len(mac_clean) != 12 or not all(c in "0123456789ABCDEFabcdef" for c in mac_clean):
+        if not mac_is_valid(host["mac"]):
             raise ValueError(f"Host {host['hostname']} has invalid MAC address format")
 
     if "commands" in host:
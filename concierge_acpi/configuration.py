@@ -3,7 +3,7 @@
 # ============================================================================
 
 import json, logging
-from typing import Optional
+from typing import Any, Optional
 
 try:
     from config_validation import validate_config_schema
@@ -14,8 +14,10 @@ logger = logging.getLogger("concierge")
 
 
 class ConciergeConfig:
-    def __init__(self, config_path: str, template_path: str, api_spec_path: Optional[str] = None, validate: bool = True):
+    def __init__(self, config_path: Optional[str], template_path: str, api_spec_path: Optional[str] = None, validate: bool = True, config_obj: Optional[Any] = None):
         self.config_path = config_path
+        # Already parsed config (hosts list or hosts/execution_plans object), takes precedence over config_path
+        self.config_obj = config_obj
         self.template_path = template_path
         self.api_spec_path = api_spec_path
 
@@ -27,9 +29,12 @@ class ConciergeConfig:
         else:
             self.api_spec = None
 
-    def _process_config_file(self, config_path: str, validate: bool):
-        with open(config_path) as f:
-            config_data = json.load(f)
+    def _process_config_file(self, config_path: Optional[str], validate: bool):
+        if self.config_obj is not None:
+            config_data = self.config_obj
+        else:
+            with open(config_path) as f:
+                config_data = json.load(f)
 
         # Validate config schema
         if validate:
@@ -45,7 +50,7 @@ class ConciergeConfig:
             self.execution_plans_config = []
 
         # Validate HTTP command configurations
-        self._validate_http_commands()
+        self._validate_http_commands(self.config)
 
         self.hosts = {h["hostname"]: h for h in self.config}
 
@@ -83,12 +88,13 @@ class ConciergeConfig:
         )
         return self.html
 
-    def _validate_http_commands(self) -> None:
+    @staticmethod
+    def _validate_http_commands(hosts) -> None:
         """Validate HTTP command configurations and log warnings for unsafe features"""
-        for host in self.config:
+        for host in hosts:
             for cmd in host.get("commands", []):
                 if cmd.get("type") == "http":
-                    self._validate_http_command(cmd, host)
+                    ConciergeConfig._validate_http_command(cmd, host)
 
     @staticmethod
     def _validate_http_command(cmd, host):
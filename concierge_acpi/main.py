@@ -4,7 +4,7 @@
 # MAIN ENTRY POINT
 # ============================================================================
 
-import logging, os, ssl, threading
+import logging, os, signal, ssl, threading
 from http.server import ThreadingHTTPServer
 
 try:
@@ -20,6 +20,10 @@ except ImportError:
 
 logger = logging.getLogger("concierge")
 
+def _interrupt(signum, frame):
+    """SIGTERM handler: take the same shutdown path as Ctrl+C so the tasks db gets closed"""
+    raise KeyboardInterrupt
+
 def main():
     """Main entry point for the application"""
     # Required
@@ -102,12 +106,14 @@ def main():
     ctx.load_cert_chain(cert_file_path, key_file_path)
     httpd.socket = ctx.wrap_socket(httpd.socket, server_side=True)
 
+    signal.signal(signal.SIGTERM, _interrupt)
     try:
         httpd.serve_forever()
     except KeyboardInterrupt:
         logger.log(logging.INFO, "Shutting down...")
     finally:
         ws_manager.stop()
+        db.close()
         logger.log(logging.INFO, "Concierge shut down.")
 
 
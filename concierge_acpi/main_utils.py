@@ -1,32 +1,46 @@
 # ============================================================================
 # UTILITY FUNCTIONS
 # ============================================================================
-import datetime, logging
+import logging, time
+from functools import lru_cache
 
 logger = logging.getLogger("concierge")
 
 def recover_dropped_tasks(db) -> None:
-    """Recover tasks that had running processes when the server was restarted"""
+    """Recover tasks that had running processes when the server was restarted, and re-tag finished ones"""
+    now = time.time_ns() // 1_000_000
     with db.lock:
         for k in db.keys():
             v = db.get(k)
             if v:
-                dropped = v.get("running", [])
-                if len(dropped) > 0:
-                    v["errors"] = v.get("errors", []) + [
-                        {**item, "error": "Process dropped during restart"} for item in dropped
-                    ]
+                dropped = v.get("running")
+                if dropped:
+                    # Mutate the existing lists in place rather than building new ones per task
+                    errors = v.setdefault("errors", [])
+                    for item in dropped:
+                        item["error"] = "Process dropped during restart"
+                    errors.extend(dropped)
                     v["running"] = []
                     if "end_timestamp" not in v:
-                        v["end_timestamp"] = int(datetime.datetime.now().timestamp() * 1000)
+                        v["end_timestamp"] = now
                     logger.log(logging.ERROR, f"Found {len(dropped)} dropped processes in task {k}")
                     db[k] = v
                     db.tag_for_removal(k)
+                elif dropped is not None:
+                    # Finished, but the removal tag may not have been flushed before the crash
+                    db.tag_for_removal(k)
+
+
+@lru_cache(maxsize=8)
+def _resolve_log_level(log_level: str) -> int:
+    """Map a level name to its number, falling back to INFO for unknown names"""
+    level = logging.getLevelName(log_level.upper())
+    return level if isinstance(level, int) else logging.INFO
 
 
 def setup_logging(log_level: str) -> None:
     """Setup logging configuration"""
     logging.basicConfig(
-        level=getattr(logging, log_level.upper(), logging.INFO),
+        level=_resolve_log_level(log_level),
         format="%(asctime)s %(levelname)s %(message)s"
     )
\ No newline at end of file
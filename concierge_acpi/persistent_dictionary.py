@@ -2,10 +2,12 @@
 # PERSISTENT DICTIONARY
 # ============================================================================
 
-import json, os, shelve, threading
-from collections import OrderedDict
+import json, logging, os, shelve, threading
+from contextlib import contextmanager
 from shelve import Shelf
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger("concierge")
 
 
 class FullDictionaryError(Exception):
@@ -18,68 +20,226 @@ class OptionallyPersistentOrderedThreadSafeDict:
     Uses shelve for persistence, maintains order in separate metadata.
     Survives unexpected restarts.
     Useful for a small serializable collection without high concurrency or frequent updates
+    Metadata writes are coalesced by a background thread every flush_interval seconds (call flush() to force one)
+    and appended to an operation log, compacted into the metadata snapshot every compact_threshold operations
+    Call close() on shutdown to stop the flusher and write a final snapshot
     *** not an actual db, not multiprocess safe, the whole thing locks on r/w ***
     """
 
-    def __init__(self, filepath: Optional[str] = None, max_size: int = 0):
+    def __init__(self, filepath: Optional[str] = None, max_size: int = 0, flush_interval: float = 0.5,
+                 compact_threshold: int = 1000):
         self._filepath = filepath
         self._max_size = max_size
+        self._flush_interval = flush_interval
+        self._compact_threshold = compact_threshold
         self.lock = threading.RLock()
+        # Metadata file writes run outside self.lock, in the order their tickets were taken under it
+        self._io_turn = threading.Condition()
+        self._io_next_ticket = 0
+        self._io_serving = 0
+        self._dirty = False
+        self._flusher = None
+        # Set by close(): wakes a sleeping flusher and stops new ones from starting
+        self._closing = threading.Event()
         self._metadata_file = f"{filepath}_metadata.json" if filepath else None
+        self._log_file = f"{filepath}_metadata.log" if filepath else None
+        self._metadata_tmp_file = f"{filepath}_metadata.json.tmp" if filepath else None
+        self._pending_ops = []
+        self._log_ops = 0
         self._load_metadata()
 
     def _load_metadata(self) -> None:
-        if self._filepath and self._metadata_file and os.path.exists(self._metadata_file):
-            with open(self._metadata_file, 'r') as fp:
-                metadata = json.load(fp)
-                self._order = metadata.get('order', [])
-                self._tagged_for_removal = OrderedDict((key, None) for key in metadata.get('tagged', []))
-        else:
-            self._order = []
-            self._tagged_for_removal = OrderedDict()
+        self._order = {}
+        self._tagged_for_removal = {}
+        if not self._filepath:
+            self._db = {}
+            return
 
-        if self._filepath:
-            with shelve.open(self._filepath) as db:
-                self._order = [key for key in self._order if key in db]
-            self._save_metadata()
-        else:
-            self._db = OrderedDict()
+        # Open directly rather than os.path.exists() first: one syscall and no check/open race
+        try:
+            # Raw bytes straight to json.loads: skips the text layer's decode and newline translation pass
+            with open(self._metadata_file, 'rb') as fp:
+                metadata = json.loads(fp.read())
+            self._order = dict.fromkeys(metadata.get('order', []))
+            self._tagged_for_removal = dict.fromkeys(metadata.get('tagged', []))
+        except FileNotFoundError:
+            pass
+
+        try:
+            with open(self._log_file, 'rb') as fp:
+                for line in fp:
+                    try:
+                        op, key = json.loads(line)
+                    except ValueError:
+                        break  # Torn last line from an interrupted write
+                    self._apply_op(op, key)
+        except FileNotFoundError:
+            pass
+
+        # Metadata trails the shelve by up to flush_interval, so after a crash drop keys already deleted
+        # from the shelve and append the ones stored since the last metadata write
+        with shelve.open(self._filepath) as db:
+            order = {key: None for key in self._order if key in db}
+            order.update(dict.fromkeys(db.keys()))
+        self._order = order
+        self._tagged_for_removal = {key: None for key in self._tagged_for_removal if key in order}
+        self._save_metadata()
 
     def _save_metadata(self) -> None:
         if self._metadata_file:
-            metadata = {
-                'order': self._order,
-                'tagged': list(self._tagged_for_removal.keys())
-            }
-            with open(self._metadata_file, 'w') as fp:
-                json.dump(metadata, fp, indent=2)
+            self._pending_ops = []
+            self._log_ops = 0
+            self._write_snapshot(list(self._order), list(self._tagged_for_removal))
+
+    def _write_snapshot(self, order: List[str], tagged: List[str]) -> None:
+        metadata = {
+            'order': order,
+            'tagged': tagged
+        }
+        # One shot compact dumps runs on the C encoder (json.dump / indent fall back to pure Python)
+        data = memoryview(json.dumps(metadata, separators=(',', ':')).encode('utf-8'))
+        fd = os.open(self._metadata_tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            while data:
+                data = data[os.write(fd, data):]
+            # On disk before the rename, so a crash never swaps in an empty snapshot
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(self._metadata_tmp_file, self._metadata_file)
+        # The snapshot now holds every logged operation
+        with open(self._log_file, 'w'):
+            pass
+
+    def _apply_op(self, op: str, key: str) -> None:
+        """Replay a logged operation on the order and removal metadata"""
+        if op == "set":
+            self._order.pop(key, None)
+            self._order[key] = None
+            self._tagged_for_removal.pop(key, None)
+        elif op == "del":
+            self._order.pop(key, None)
+            self._tagged_for_removal.pop(key, None)
+        elif op == "tag" and key in self._order:
+            self._tagged_for_removal.setdefault(key)
+
+    def _log_op(self, op: str, key: str) -> None:
+        if self._log_file:
+            self._pending_ops.append((op, key))
+
+    def _append_log(self, ops: List[tuple]) -> None:
+        data = "".join(json.dumps(op, separators=(',', ':')) + "\n" for op in ops)
+        with open(self._log_file, 'a') as fp:
+            fp.write(data)
+
+    def _mark_dirty(self) -> None:
+        """Schedule a metadata write; must be called holding the lock"""
+        self._dirty = True
+        if self._flusher is None and not self._closing.is_set():
+            self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        while True:
+            with self.lock:
+                # Exit once idle so quiet or short-lived dicts do not each pin a thread
+                if not self._dirty:
+                    self._flusher = None
+                    return
+            # Let more mutations pile up before writing
+            self._closing.wait(self._flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Failed to write metadata for {self._filepath}: {e}")
+
+    def _take_io_ticket(self) -> int:
+        """Reserve the next metadata write turn; must be called holding the lock"""
+        ticket = self._io_next_ticket
+        self._io_next_ticket += 1
+        return ticket
+
+    def _write_in_turn(self, ticket: int, write: Callable, *args) -> None:
+        """Run a metadata write once all earlier tickets are done, without holding self.lock"""
+        # File I/O and the wait for it happen outside self.lock so mutations are never blocked on disk
+        with self._io_turn:
+            while self._io_serving != ticket:
+                self._io_turn.wait()
+        try:
+            write(*args)
+        finally:
+            with self._io_turn:
+                self._io_serving += 1
+                self._io_turn.notify_all()
+
+    def flush(self) -> None:
+        """Write pending metadata changes now"""
+        with self.lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            ops, self._pending_ops = self._pending_ops, []
+            if self._log_ops + len(ops) >= self._compact_threshold:
+                self._log_ops = 0
+                write, args = self._write_snapshot, (list(self._order), list(self._tagged_for_removal))
+            else:
+                self._log_ops += len(ops)
+                write, args = self._append_log, (ops,)
+            ticket = self._take_io_ticket()
+        self._write_in_turn(ticket, write, *args)
+
+    def compact(self) -> None:
+        """Rewrite the metadata snapshot and truncate the operation log"""
+        if not self._metadata_file:
+            return
+        with self.lock:
+            self._dirty = False
+            self._pending_ops = []
+            self._log_ops = 0
+            snapshot = (list(self._order), list(self._tagged_for_removal))
+            ticket = self._take_io_ticket()
+        self._write_in_turn(ticket, self._write_snapshot, *snapshot)
+
+    def close(self) -> None:
+        """Stop background flushing and write the final metadata snapshot"""
+        self._closing.set()
+        with self.lock:
+            flusher = self._flusher
+        if flusher is not None:
+            flusher.join()
+        self.compact()
 
     def __setitem__(self, key: str, value: Any) -> None:
         with self.lock:
             if self._filepath:
                 with shelve.open(self._filepath, writeback=True) as db:
                     self._set_item(db, key, value)
-                self._save_metadata()
+                self._mark_dirty()
             else:
                 self._set_item(self._db, key, value)
 
     def _set_item(self, db: Dict|Shelf, key: str, value: Any) -> None:
         if key in db:
             db[key] = value
-            self._order.remove(key)
-            self._order.append(key)
+            # Plain dict keeps insertion order: re-inserting moves the key to the end
+            self._order.pop(key, None)
+            self._order[key] = None
             self._tagged_for_removal.pop(key, None)
         else:
             if 0 < self._max_size <= len(self._order):
                 if not self._tagged_for_removal:
                     raise FullDictionaryError("No entry tagged for removal")
 
-                removal_key, _ = self._tagged_for_removal.popitem(last=False)
+                # Ordered set (dict of key -> None): O(1) membership, evicts first tagged
+                removal_key = next(iter(self._tagged_for_removal))
+                del self._tagged_for_removal[removal_key]
                 del db[removal_key]
-                self._order.remove(removal_key)
+                del self._order[removal_key]
+                self._log_op("del", removal_key)
 
             db[key] = value
-            self._order.append(key)
+            self._order[key] = None
+        self._log_op("set", key)
 
     def __getitem__(self, key: str) -> Any:
         with self.lock:
@@ -93,15 +253,16 @@ class OptionallyPersistentOrderedThreadSafeDict:
             if self._filepath:
                 with shelve.open(self._filepath, writeback=True) as db:
                     self._del_internal(db, key)
-                self._save_metadata()
+                self._mark_dirty()
             else:
                 self._del_internal(self._db, key)
 
     def _del_internal(self, db: Dict|Shelf, key: str) -> None:
         if key in db:
             del db[key]
-            self._order.remove(key)
+            del self._order[key]
             self._tagged_for_removal.pop(key, None)
+            self._log_op("del", key)
 
     def __len__(self) -> int:
         with self.lock:
@@ -120,20 +281,21 @@ class OptionallyPersistentOrderedThreadSafeDict:
         with self.lock:
             if key in self._order and key not in self._tagged_for_removal:
                 self._tagged_for_removal[key] = None
+                self._log_op("tag", key)
                 if self._filepath:
-                    self._save_metadata()
+                    self._mark_dirty()
 
     def get_oldest_key(self) -> str:
         with self.lock:
             if not self._order:
                 raise KeyError("Dictionary is empty")
-            return self._order[0]
+            return next(iter(self._order))
 
     def get_newest(self) -> Any:
         with self.lock:
             if not self._order:
                 raise KeyError("Dictionary is empty")
-            key = self._order[-1]
+            key = next(reversed(self._order))
             if not self._filepath:
                 return self._db[key]
             with shelve.open(self._filepath) as db:
@@ -149,9 +311,33 @@ class OptionallyPersistentOrderedThreadSafeDict:
             except Exception:
                 return default
 
+    @contextmanager
+    def transaction(self, key: str) -> Iterator[Any]:
+        """
+        Yield the value under key (None if missing) for in-place mutation and store it back on exit,
+        holding the lock throughout and opening the shelve once instead of once per get and set.
+        If the body raises nothing is stored when persistent; in memory the value yielded is the stored
+        object itself, so mutations made before the error are already in place
+        """
+        with self.lock:
+            if not self._filepath:
+                value = self._db.get(key)
+                yield value
+                if value is not None:
+                    self._set_item(self._db, key, value)
+                return
+            # No writeback cache: a body that raises must leave the stored value untouched
+            with shelve.open(self._filepath) as db:
+                value = db.get(key)
+                yield value
+                if value is not None:
+                    self._set_item(db, key, value)
+            if value is not None:
+                self._mark_dirty()
+
     def keys(self) -> List[str]:
         with self.lock:
-            return self._order.copy()
+            return list(self._order)
 
     def get_items_reversed(self) -> List[Any]:
         with self.lock:
@@ -4,19 +4,23 @@
 
 from typing import Any, Dict, List, Optional, Tuple
 
+# POST route segment -> (action, whether a command name follows the segment)
+_POST_ROUTES = {"wakeup": ("wakeup", False), "commands": ("command", True)}
+
 class RequestParser:
     @staticmethod
     def parse_post_path(path: str) -> Tuple[str, Optional[str], Optional[str]]:
         parts = path.strip("/").split("/")
-        if len(parts) < 4:
+        route = _POST_ROUTES.get(parts[3]) if len(parts) >= 4 else None
+        if route is None:
             raise ValueError("Invalid API path")
 
-        if parts[3] == "wakeup" and 4 <= len(parts) <= 5:
-            return "wakeup", None, parts[4] if len(parts) == 5 else None
-        elif parts[3] == "commands" and 5 <= len(parts) <= 6:
-            return "command", parts[4], parts[5] if len(parts) == 6 else None
-        else:
+        action, has_command = route
+        # Index of the optional trailing hostname
+        host_idx = 5 if has_command else 4
+        if not host_idx <= len(parts) <= host_idx + 1:
             raise ValueError("Invalid API path")
+        return action, parts[4] if has_command else None, parts[host_idx] if len(parts) > host_idx else None
 
 
 class HostValidator:
@@ -28,8 +32,8 @@ class HostValidator:
 
     @staticmethod
     def validate_command_host(hostname: str, host_entry: Dict[str, Any], command_name: str) -> Tuple[Optional[Dict[str, str]], Optional[Tuple[Dict[str, Any], int, bool]]]:
-        commands = {cmd["name"]: cmd for cmd in host_entry.get("commands", [])}
-        cmd = commands.get(command_name)
+        # Scan instead of building a name -> command dict per host per request; last definition wins as before
+        cmd = next((cmd for cmd in reversed(host_entry.get("commands", [])) if cmd["name"] == command_name), None)
 
         if not cmd:
             return {"hostname": hostname, "error": "Command not allowed"}, None
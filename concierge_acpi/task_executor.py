@@ -3,13 +3,13 @@
 # ============================================================================
 
 
-import os, ssl, json, subprocess, logging, threading, uuid, datetime, base64, struct, select
+import os, ssl, json, subprocess, logging, threading, uuid, time, base64, struct, select, queue
 from http.client import HTTPConnection, HTTPSConnection
 from urllib.parse import urlencode, quote
-from typing import Dict, Tuple, Optional, Any
+from typing import Dict, Iterable, List, Tuple, Optional, Any
 
 try:
-    from task_executor_helper import send_wol, replace_placeholders, replace_json_placeholders
+    from task_executor_helper import send_wol, replace_placeholders, replace_json_placeholders, remove_running_host
 except ImportError:
     pass
 
@@ -237,17 +237,15 @@ class StreamableProcess:
                 pass
 
     def _update_task(self, error=None):
-        with self.db.lock:
-            task = self.db.get(self.task_id)
+        finished = False
+        with self.db.transaction(self.task_id) as task:
             if task:
-                hostname_dict = {"hostname": self.hostname}
-
                 if error:
                     task["errors"].append({"hostname": self.hostname, "error": error})
                 elif self.aborted:
                     task["errors"].append({"hostname": self.hostname, "error": "Aborted"})
                 elif self.proc and self.proc.returncode == 0:
-                    task["success"].append(hostname_dict)
+                    task["success"].append({"hostname": self.hostname})
                 elif self.proc:
                     task["errors"].append({
                         "hostname": self.hostname,
@@ -256,27 +254,80 @@ class StreamableProcess:
                 else:
                     task["errors"].append({"hostname": self.hostname, "error": "Process failed to start"})
 
-                if hostname_dict in task["running"]:
-                    task["running"].remove(hostname_dict)
-
-                if not task["running"]:
-                    if "end_timestamp" not in task:
-                        task["end_timestamp"] = int(datetime.datetime.now().timestamp() * 1000)
-                    self.db.tag_for_removal(self.task_id)
+                remove_running_host(task["running"], self.hostname)
 
-                self.db[self.task_id] = task
+                finished = not task["running"]
+                if finished and "end_timestamp" not in task:
+                    task["end_timestamp"] = time.time_ns() // 1_000_000
+        # Tag after the write-back: storing an entry clears its removal tag
+        if finished:
+            self.db.tag_for_removal(self.task_id)
 
-                if self.ws_manager:
-                    if self.proc and self.proc.returncode == 0:
-                        self.ws_manager.broadcast_status(self.task_id, self.hostname, "success")
-                    else:
-                        self.ws_manager.broadcast_status(self.task_id, self.hostname, "error")
+        # Outside the transaction so a slow websocket client never holds the db lock
+        if task and self.ws_manager:
+            if self.proc and self.proc.returncode == 0:
+                self.ws_manager.broadcast_status(self.task_id, self.hostname, "success")
+            else:
+                self.ws_manager.broadcast_status(self.task_id, self.hostname, "error")
 
     def abort(self):
         self.aborted = True
         self._terminate()
 
 
+# Idle keep-alive (connection, released_at) pairs by (is_https, host, skip_cert_validation), reused across tasks
+_HTTP_POOL: Dict[Tuple[bool, str, bool], list] = {}
+_HTTP_POOL_LOCK = threading.Lock()
+_HTTP_POOL_MAX_IDLE = 8
+# Seconds an idle connection may be reused; below common server keep-alive timeouts (Apache 5s, nginx 75s)
+_HTTP_POOL_MAX_IDLE_AGE = 2.0
+# Methods safe to resend when a reused connection drops after the request went out (RFC 9110 9.2.2)
+_IDEMPOTENT_METHODS = frozenset(("GET", "HEAD", "PUT", "DELETE", "OPTIONS"))
+
+
+def _idle_connection_usable(conn: HTTPConnection, released_at: float) -> bool:
+    """Whether a pooled connection is young enough and has nothing to read: data or EOF on an idle one means the server closed it"""
+    if conn.sock is None or time.monotonic() - released_at > _HTTP_POOL_MAX_IDLE_AGE:
+        return False
+    try:
+        readable, _, _ = select.select([conn.sock], [], [], 0)
+    except (OSError, ValueError, TypeError):
+        return False
+    return not readable
+
+
+class _DaemonWorkerPool:
+    """Up to max_workers daemon threads reused across jobs (daemons never hold up shutdown)"""
+    def __init__(self, max_workers: int, name: str):
+        self._max_workers = max_workers
+        self._name = name
+        self._jobs = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._workers = 0
+        self._idle = 0
+
+    def submit(self, fn) -> None:
+        with self._lock:
+            if self._idle:
+                self._idle -= 1
+            elif self._workers < self._max_workers:
+                self._workers += 1
+                threading.Thread(target=self._work, name=f"{self._name}-{self._workers}", daemon=True).start()
+        self._jobs.put(fn)
+
+    def _work(self) -> None:
+        while True:
+            fn = self._jobs.get()
+            try:
+                fn()
+            except Exception as e:
+                logger.error(f"Unhandled error in {self._name} worker: {e}")
+            with self._lock:
+                self._idle += 1
+
+
+_HTTP_WORKERS = _DaemonWorkerPool(32, "concierge-http")
+
 class HTTPProcess:
     def __init__(self, task_id: str, hostname: str, config: Dict[str, Any], params: Optional[Dict[str, Any]], db):
         self.task_id = task_id
@@ -284,43 +335,34 @@ class HTTPProcess:
         self.config = config
         self.params = params
         self.db = db
-        self.thread = None
         self.aborted = False
 
     def _update_tasks(self, success: bool, error_msg: Optional[str] = None, output: Optional[str] = None, response_code: Optional[int] = None) -> None:
-        with self.db.lock:
-            entry = self.db.get(self.task_id)
+        # Build the result record before taking the lock; inside it only the list updates remain
+        if self.aborted:
+            field, result = "errors", {"hostname": self.hostname, "error": "Task aborted"}
+        else:
+            if success:
+                field, result = "success", {"hostname": self.hostname}
+            else:
+                field, result = "errors", {"hostname": self.hostname, "error": error_msg or "Unknown error"}
+            if output is not None:
+                result["output"] = output
+            if response_code is not None:
+                result["response_code"] = response_code
+
+        finished = False
+        with self.db.transaction(self.task_id) as entry:
             if entry:
-                hostname_dict = {"hostname": self.hostname}
-                if self.aborted:
-                    entry["errors"].append({
-                        "hostname": self.hostname,
-                        "error": "Task aborted"
-                    })
-                elif success:
-                    result = {"hostname": self.hostname}
-                    if output is not None:
-                        result["output"] = output
-                    if response_code is not None:
-                        result["response_code"] = response_code
-                    entry["success"].append(result)
-                else:
-                    error_data = {"hostname": self.hostname, "error": error_msg or "Unknown error"}
-                    if output is not None:
-                        error_data["output"] = output
-                    if response_code is not None:
-                        error_data["response_code"] = response_code
-                    entry["errors"].append(error_data)
-
-                if hostname_dict in entry["running"]:
-                    entry["running"].remove(hostname_dict)
+                entry[field].append(result)
 
-                if not entry["running"]:
-                    if "end_timestamp" not in entry:
-                        entry["end_timestamp"] = int(datetime.datetime.now().timestamp() * 1000)
-                    self.db.tag_for_removal(self.task_id)
+                remove_running_host(entry["running"], self.hostname)
 
-                self.db[self.task_id] = entry
+                finished = not entry["running"]
+                if finished and "end_timestamp" not in entry:
+                    entry["end_timestamp"] = time.time_ns() // 1_000_000
+        if finished:
+            self.db.tag_for_removal(self.task_id)
 
     def _execute_http(self) -> None:
         try:
@@ -371,43 +413,95 @@ class HTTPProcess:
                     raise ValueError(f"Unknown payload_placeholder_replacement mode: {payload_replacement_mode}")
 
             timeout = self.config.get("timeout", 30)
-            conn_class = HTTPSConnection if is_https else HTTPConnection
+            pool_key = (is_https, host, bool(is_https and self.config.get("skip_cert_validation", False)))
+            status, response_data = self._request(pool_key, timeout, method, path, payload, headers)
+            response_data = response_data.decode('utf-8', errors='replace')
+
+            success = 200 <= status < 300
+            self._update_tasks(
+                success=success,
+                error_msg=None if success else f"HTTP {status}",
+                output=response_data[:1000] if response_data else None,
+                response_code=status
+            )
 
-            if is_https:
-                skip_cert_validation = self.config.get("skip_cert_validation", False)
-                if skip_cert_validation:
-                    context = ssl._create_unverified_context()
-                    conn = conn_class(host, timeout=timeout, context=context)
-                else:
-                    conn = conn_class(host, timeout=timeout)
-            else:
-                conn = conn_class(host, timeout=timeout)
+        except Exception as e:
+            self._update_tasks(success=False, error_msg=str(e))
 
+    @staticmethod
+    def _new_connection(pool_key: Tuple[bool, str, bool], timeout: int) -> HTTPConnection:
+        is_https, host, skip_cert_validation = pool_key
+        if not is_https:
+            return HTTPConnection(host, timeout=timeout)
+        if skip_cert_validation:
+            return HTTPSConnection(host, timeout=timeout, context=ssl._create_unverified_context())
+        return HTTPSConnection(host, timeout=timeout)
+
+    @staticmethod
+    def _release_connection(pool_key: Tuple[bool, str, bool], conn: HTTPConnection) -> None:
+        with _HTTP_POOL_LOCK:
+            idle = _HTTP_POOL.setdefault(pool_key, [])
+            if len(idle) < _HTTP_POOL_MAX_IDLE:
+                idle.append((conn, time.monotonic()))
+                return
+        conn.close()
+
+    def _request(self, pool_key: Tuple[bool, str, bool], timeout: int, method: str, path: str,
+                 payload: Optional[bytes], headers: Dict[str, str]) -> Tuple[int, bytes]:
+        """
+        Send a request on a pooled keep-alive connection, retrying once on a fresh one if the pooled one went stale.
+        Any part of the request may have reached the server, so only idempotent methods are resent
+        """
+        conn = None
+        stale = []
+        with _HTTP_POOL_LOCK:
+            idle = _HTTP_POOL.get(pool_key)
+            while idle:
+                candidate, released_at = idle.pop()
+                if _idle_connection_usable(candidate, released_at):
+                    conn = candidate
+                    break
+                stale.append(candidate)
+        for candidate in stale:
+            candidate.close()
+        reused = conn is not None
+        while True:
+            if conn is None:
+                conn = self._new_connection(pool_key, timeout)
+            else:
+                conn.timeout = timeout
+                if conn.sock:
+                    conn.sock.settimeout(timeout)
             try:
                 conn.request(method, path, body=payload, headers=headers)
                 response = conn.getresponse()
-                response_data = response.read().decode('utf-8', errors='replace')
-
-                success = 200 <= response.status < 300
-                self._update_tasks(
-                    success=success,
-                    error_msg=None if success else f"HTTP {response.status}",
-                    output=response_data[:1000] if response_data else None,
-                    response_code=response.status
-                )
-            finally:
+                data = response.read()
+            except ConnectionError:
                 conn.close()
-
-        except Exception as e:
-            self._update_tasks(success=False, error_msg=str(e))
+                if not reused or method not in _IDEMPOTENT_METHODS:
+                    raise
+                # Server dropped the idle connection
+                reused = False
+                conn = None
+                continue
+            except Exception:
+                conn.close()
+                raise
+            if response.will_close:
+                conn.close()
+            else:
+                self._release_connection(pool_key, conn)
+            return response.status, data
 
     def run_async(self) -> None:
         def target():
             if not self.aborted:
                 self._execute_http()
+            else:
+                # Aborted while queued behind busy workers: report it so the host leaves running
+                self._update_tasks(success=False)
 
-        self.thread = threading.Thread(target=target, daemon=True)
-        self.thread.start()
+        _HTTP_WORKERS.submit(target)
 
     def run_sync(self) -> None:
         if not self.aborted:
@@ -435,21 +529,29 @@ class TaskExecutor:
         self.ws_manager = ws_manager
 
     def _atomic_task_update(self, task_id: str, field: str, value: Dict[str, Any]) -> None:
-        with self.db.lock:
-            task = self.db[task_id]
-            hostname_dict = {"hostname": value["hostname"]}
-            if hostname_dict in task["running"]:
-                task["running"].remove(hostname_dict)
-            task[field].append(value)
-            if not task["running"]:
-                if "end_timestamp" not in task:
-                    task["end_timestamp"] = int(datetime.datetime.now().timestamp() * 1000)
-                self.db.tag_for_removal(task_id)
-            self.db[task_id] = task
-
-    def execute_wakeup(self, task_id: str, hostname: str, entry: Dict[str, Any], log_callback) -> None:
+        self._atomic_task_updates(task_id, ((field, value),))
+
+    def _atomic_task_updates(self, task_id: str, updates: Iterable[Tuple[str, Dict[str, Any]]]) -> None:
+        """Move each (field, value) host result out of running in a single write of the task"""
+        with self.db.transaction(task_id) as task:
+            if task is None:
+                raise KeyError(task_id)
+            for field, value in updates:
+                remove_running_host(task["running"], value["hostname"])
+                task[field].append(value)
+            finished = not task["running"]
+            if finished and "end_timestamp" not in task:
+                task["end_timestamp"] = time.time_ns() // 1_000_000
+        if finished:
+            self.db.tag_for_removal(task_id)
+
+    def execute_wakeup(self, task_id: str, hostname: str, entry: Dict[str, Any], log_callback,
+                       updates: Optional[List[Tuple[str, Dict[str, Any]]]] = None) -> None:
         send_wol(entry.get("mac"))
-        self._atomic_task_update(task_id, "success", {"hostname": hostname})
+        if updates is None:
+            self._atomic_task_update(task_id, "success", {"hostname": hostname})
+        else:
+            updates.append(("success", {"hostname": hostname}))
         log_callback(logging.INFO, "wakeup sent", hostname)
 
     def execute_http_async(self, task_id: str, hostname: str, entry: Dict[str, Any], params: Optional[Dict[str, Any]], log_callback) -> None:
@@ -501,11 +603,18 @@ class TaskExecutor:
             self.scheduler.execute_plan(plan_name, task_id, log_callback)
             return
 
+        # Results known right away (wakeups sent, hosts that failed to start) are stored together
+        # once the loop ends, instead of rewriting the whole task once per host
+        updates = []
         for hostname, (entry, timeout, is_sync) in entries.items():
             try:
                 if action == "wakeup":
-                    self.execute_wakeup(task_id, hostname, entry, log_callback)
+                    self.execute_wakeup(task_id, hostname, entry, log_callback, updates)
                 else:
+                    if is_sync and updates:
+                        # A sync command blocks up to its timeout: store earlier results first
+                        self._atomic_task_updates(task_id, updates)
+                        updates = []
                     cmd_type = entry.get("type", "shell")
                     if cmd_type == "http":
                         if is_sync:
@@ -518,16 +627,18 @@ class TaskExecutor:
                         else:
                             self.execute_shell_async(task_id, hostname, entry, timeout, params, log_callback)
             except Exception as e:
-                self._atomic_task_update(task_id, "errors", {"hostname": hostname, "error": str(e)})
+                updates.append(("errors", {"hostname": hostname, "error": str(e)}))
                 log_callback(logging.INFO, f"action failed ({str(e)})", hostname)
                 if logger.isEnabledFor(logging.DEBUG):
                     logging.exception(e)
+        if updates:
+            self._atomic_task_updates(task_id, updates)
 
     def create_task(self, command_name: Optional[str], entries: Dict[str, Tuple[Dict[str, Any], int, bool]], execution_plan: Optional[str] = None) -> str:
         task_id = str(uuid.uuid4())
         task_data = {
             "task_id": task_id,
-            "start_timestamp": int(datetime.datetime.now().timestamp() * 1000),
+            "start_timestamp": time.time_ns() // 1_000_000,
             "command": command_name,
             "success": [],
             "running": [{"hostname": hostname} for hostname in entries.keys()],
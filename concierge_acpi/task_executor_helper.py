@@ -2,107 +2,250 @@
 # HELPER FUNCTIONS
 # ============================================================================
 
-import json, socket
-from typing import Any, Dict, Optional
+import json, math, re, socket, threading
+from json.encoder import encode_basestring_ascii
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+_PLACEHOLDER_RE = re.compile(r"<([^<>]+)>")
+
+@lru_cache(maxsize=1024)
+def _split_template(text: str) -> Tuple[str, ...]:
+    """Split configured text once into alternating literal and placeholder name chunks"""
+    return tuple(_PLACEHOLDER_RE.split(text))
 
 def replace_placeholders(text: str, hostname: str, params: Optional[Dict[str, Any]]) -> str:
-    if not isinstance(text, str):
+    # Most configured values carry no placeholder: a substring scan is cheaper than the cache lookup
+    if not isinstance(text, str) or "<" not in text:
         return text
-    result = text.replace("<hostname>", hostname)
-    if params:
-        for key, value in params.items():
-            result = result.replace(f"<{key}>", str(value))
-    return result
+    parts = _split_template(text)
+    if len(parts) == 1:
+        return text
+    params = params or {}
+    chunks = list(parts)
+    for i in range(1, len(chunks), 2):
+        name = chunks[i]
+        if name == "hostname":
+            chunks[i] = hostname
+        elif name in params:
+            chunks[i] = str(params[name])
+        else:
+            chunks[i] = f"<{name}>"
+    return "".join(chunks)
+
+
+_JSON_PLACEHOLDER_RE = re.compile(r"<(string|number|boolean|json|array)_([^<>]+)>")
+# Stand-ins of the right JSON type, used to check a template's structure before any values are known
+_JSON_PLACEHOLDER_SAMPLES = {"string": '""', "number": "0", "boolean": "true", "json": "{}", "array": "[]"}
+# Slot types whose emitted text is a single token: a quoted string is self-delimited, while a number
+# or boolean only is when bounded by delimiters (-<number_n> gives --5 for -5). json/array values can
+# contain quotes and may sit in a string
+_SCALAR_SLOT_TYPES = frozenset(("string", "number", "boolean"))
+# Characters that end a JSON token; '"' only borders a parsing number or boolean sample inside a string
+_JSON_TOKEN_DELIMITERS = frozenset(' \t\n\r,:[]{}"')
+
+@lru_cache(maxsize=256)
+def _compile_json_template(json_text: str) -> Tuple[Tuple[str, ...], Tuple[Tuple[Callable, str, str], ...], bool]:
+    """
+    Compile a JSON payload template once into its literals and the (emitter, name, placeholder) slots
+    between them, and check whether any full substitution is known to be valid JSON without parsing it
+    """
+    parts = _JSON_PLACEHOLDER_RE.split(json_text)
+    literals = tuple(parts[0::3])
+    slots = tuple(
+        (_JSON_EMITTERS[type_prefix], key, f"<{type_prefix}_{key}>")
+        for type_prefix, key in zip(parts[1::3], parts[2::3])
+    )
+    sample = "".join(
+        part if i % 3 == 0 else _JSON_PLACEHOLDER_SAMPLES[part] if i % 3 == 1 else ""
+        for i, part in enumerate(parts)
+    )
+    if not _SCALAR_SLOT_TYPES.issuperset(parts[1::3]):
+        return literals, slots, False
+    for i, type_prefix in enumerate(parts[1::3]):
+        if type_prefix == "string":
+            continue
+        # An empty neighbour is the template boundary for the outer literals, another slot otherwise
+        before, after = literals[i][-1:], literals[i + 1][:1]
+        if (before not in _JSON_TOKEN_DELIMITERS and (before or i > 0)) or \
+                (after not in _JSON_TOKEN_DELIMITERS and (after or i + 2 < len(literals))):
+            return literals, slots, False
+    try:
+        json.loads(sample)
+        return literals, slots, True
+    except json.JSONDecodeError:
+        return literals, slots, False
+
+
+def _emit_string(key: str, value: Any) -> str:
+    # Escape and quote as JSON string (the C escaper json.dumps ends up calling for a str)
+    return encode_basestring_ascii(value if isinstance(value, str) else str(value))
+
+
+def _emit_number(key: str, value: Any) -> str:
+    # Validate it's a number: ints render as is, anything with a '.' as a finite float
+    try:
+        if isinstance(value, bool):
+            raise ValueError("Boolean not allowed for number type")
+        if type(value) is int:
+            return int.__repr__(value)
+        text = value if isinstance(value, str) else str(value)
+        if '.' not in text:
+            return int.__repr__(int(value))
+        num_val = float(value)
+        if not math.isfinite(num_val):
+            raise ValueError("Not a finite number")
+        return float.__repr__(num_val)
+    except (ValueError, TypeError, OverflowError):
+        raise ValueError(f"Parameter '{key}' cannot be converted to number for <number_{key}>")
+
+
+# Accepted boolean spellings in their common casings, so typical inputs resolve without lowercasing
+_BOOLEAN_SPELLINGS = {
+    spelling: literal
+    for literal, words in (("true", ("true", "1", "yes")), ("false", ("false", "0", "no")))
+    for word in words
+    for spelling in (word, word.capitalize(), word.upper())
+}
+
+def _emit_boolean(key: str, value: Any) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    literal = _BOOLEAN_SPELLINGS.get(value) if isinstance(value, str) else None
+    if literal is None:
+        # Mixed casings and non-string values
+        literal = _BOOLEAN_SPELLINGS.get(str(value).lower())
+    if literal is None:
+        raise ValueError(f"Parameter '{key}' cannot be converted to boolean for <boolean_{key}>")
+    return literal
+
+
+def _emit_json(key: str, value: Any) -> str:
+    # Must be valid JSON object
+    try:
+        if isinstance(value, str):
+            parsed = json.loads(value)
+            if not isinstance(parsed, dict):
+                raise ValueError("Must be a JSON object")
+            return value
+        elif isinstance(value, dict):
+            return json.dumps(value)
+        else:
+            raise ValueError("Must be a JSON object")
+    except (json.JSONDecodeError, TypeError):
+        raise ValueError(f"Parameter '{key}' is not valid JSON for <json_{key}>")
+
+
+def _emit_array(key: str, value: Any) -> str:
+    # Must be valid JSON array
+    try:
+        if isinstance(value, str):
+            parsed = json.loads(value)
+            if not isinstance(parsed, list):
+                raise ValueError("Must be a JSON array")
+            return value
+        elif isinstance(value, list):
+            return json.dumps(value)
+        else:
+            raise ValueError("Must be a JSON array")
+    except (json.JSONDecodeError, TypeError):
+        raise ValueError(f"Parameter '{key}' is not valid JSON array for <array_{key}>")
+
+
+_JSON_EMITTERS = {
+    "string": _emit_string,
+    "number": _emit_number,
+    "boolean": _emit_boolean,
+    "json": _emit_json,
+    "array": _emit_array,
+}
 
 
 def replace_json_placeholders(json_text: str, hostname: str, params: Optional[Dict[str, Any]]) -> str:
     """
     Safely replace typed placeholders in JSON text.
     Supports: <string_name>, <number_name>, <boolean_name>, <json_name>, <array_name>
-    The resulting JSON must be valid.
+    Raises ValueError unless the result is valid JSON.
     """
     if not isinstance(json_text, str):
         return json_text
 
-    result = json_text
-    all_params = {"hostname": hostname}
-    if params:
-        all_params.update(params)
-
-    for key, value in all_params.items():
-        for type_prefix in ["string", "number", "boolean", "json", "array"]:
-            placeholder = f"<{type_prefix}_{key}>"
-            if placeholder not in result:
-                continue
-
-            replacement = None
-
-            if type_prefix == "string":
-                # Escape and quote as JSON string
-                replacement = json.dumps(str(value))
-            elif type_prefix == "number":
-                # Validate it's a number
-                try:
-                    if isinstance(value, bool):
-                        raise ValueError("Boolean not allowed for number type")
-                    num_val = float(value) if '.' in str(value) else int(value)
-                    replacement = json.dumps(num_val)
-                except (ValueError, TypeError):
-                    raise ValueError(f"Parameter '{key}' cannot be converted to number for {placeholder}")
-            elif type_prefix == "boolean":
-                if isinstance(value, bool):
-                    replacement = json.dumps(value)
-                elif str(value).lower() in ["true", "1", "yes"]:
-                    replacement = "true"
-                elif str(value).lower() in ["false", "0", "no"]:
-                    replacement = "false"
-                else:
-                    raise ValueError(f"Parameter '{key}' cannot be converted to boolean for {placeholder}")
-            elif type_prefix == "json":
-                # Must be valid JSON object
-                try:
-                    if isinstance(value, str):
-                        parsed = json.loads(value)
-                        if not isinstance(parsed, dict):
-                            raise ValueError("Must be a JSON object")
-                        replacement = value
-                    elif isinstance(value, dict):
-                        replacement = json.dumps(value)
-                    else:
-                        raise ValueError("Must be a JSON object")
-                except (json.JSONDecodeError, TypeError):
-                    raise ValueError(f"Parameter '{key}' is not valid JSON for {placeholder}")
-            elif type_prefix == "array":
-                # Must be valid JSON array
-                try:
-                    if isinstance(value, str):
-                        parsed = json.loads(value)
-                        if not isinstance(parsed, list):
-                            raise ValueError("Must be a JSON array")
-                        replacement = value
-                    elif isinstance(value, list):
-                        replacement = json.dumps(value)
-                    else:
-                        raise ValueError("Must be a JSON array")
-                except (json.JSONDecodeError, TypeError):
-                    raise ValueError(f"Parameter '{key}' is not valid JSON array for {placeholder}")
-
-            if replacement is not None:
-                result = result.replace(placeholder, replacement)
-
-    # Validate final JSON
-    try:
-        json.loads(result)
-    except json.JSONDecodeError as e:
-        raise ValueError(f"Resulting payload is not valid JSON after placeholder replacement: {e}")
+    literals, slots, always_valid = _compile_json_template(json_text)
+    if not slots and always_valid:
+        return json_text
+    params = params or {}
+
+    chunks = [literals[0]]
+    all_replaced = True
+    for i, (emit, key, placeholder) in enumerate(slots, 1):
+        # Request params take precedence over the built-in hostname
+        if key in params:
+            chunks.append(emit(key, params[key]))
+        elif key == "hostname":
+            chunks.append(emit(key, hostname))
+        else:
+            chunks.append(placeholder)
+            all_replaced = False
+        chunks.append(literals[i])
+    result = "".join(chunks)
+
+    # Scalar-only templates whose sample parses stay valid once filled; anything else is checked here
+    if not (always_valid and all_replaced):
+        try:
+            json.loads(result)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Resulting payload is not valid JSON after placeholder replacement: {e}")
 
     return result
 
 
+def remove_running_host(running: List[Dict[str, Any]], hostname: str) -> None:
+    """Drop the {"hostname": hostname} entry from a task's running list in one pass"""
+    for i, item in enumerate(running):
+        if len(item) == 1 and item.get("hostname") == hostname:
+            del running[i]
+            return
+
+
+_MAC_SEPARATORS = str.maketrans("", "", ":-")
+_MAC_HEX = re.compile(r"[0-9A-Fa-f]{12}").fullmatch
+
+def mac_is_valid(mac: str) -> bool:
+    """Whether mac is 12 hex digits, optionally separated by ':' or '-'"""
+    return _MAC_HEX(mac.translate(_MAC_SEPARATORS)) is not None
+
+# Broadcast socket shared by all wakeups, opened on first use
+_WOL_SOCK = None
+_WOL_LOCK = threading.Lock()
+
+def _wol_socket() -> socket.socket:
+    global _WOL_SOCK
+    with _WOL_LOCK:
+        if _WOL_SOCK is None:
+            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+            _WOL_SOCK = s
+        return _WOL_SOCK
+
+@lru_cache(maxsize=1024)
+def _wol_packet(mac: str) -> bytes:
+    """Build the magic packet for mac once; configured MACs repeat on every wakeup"""
+    digits = mac.translate(_MAC_SEPARATORS)
+    if not _MAC_HEX(digits):
+        raise ValueError(f"Invalid MAC address: {mac}")
+    return b"\xff" * 6 + bytes.fromhex(digits) * 16
+
 def send_wol(mac: str) -> None:
     """Send Wake-on-LAN magic packet"""
-    mac = mac.replace(":", "").replace("-", "").lower()
-    pkt = bytes.fromhex("FF"*6 + mac*16)
-    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
-        s.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-        s.sendto(pkt, ("255.255.255.255", 9))
\ No newline at end of file
+    global _WOL_SOCK
+    pkt = _wol_packet(mac)
+    s = _wol_socket()
+    try:
+        s.sendto(pkt, ("255.255.255.255", 9))
+    except OSError:
+        # Drop the socket so the next wakeup starts from a fresh one
+        with _WOL_LOCK:
+            if _WOL_SOCK is s:
+                _WOL_SOCK = None
+        s.close()
+        raise
\ No newline at end of file
@@ -2,7 +2,7 @@
 # EXECUTION PLAN CLASSES
 # ============================================================================
 
-import logging, threading, datetime, time
+import logging, threading, time
 from typing import Dict, List, Optional, Any
 
 try:
@@ -54,13 +54,11 @@ class TaskScheduler:
                 self._execute_plan_sync(plan_name, parent_task_id, log_callback)
             except Exception as e:
                 log_callback(logging.ERROR, f"Execution plan failed: {str(e)}", None)
-                with self.db.lock:
-                    task = self.db.get(parent_task_id)
+                with self.db.transaction(parent_task_id) as task:
                     if task:
                         task["errors"].append({"error": f"Execution plan error: {str(e)}"})
                         if "end_timestamp" not in task:
-                            task["end_timestamp"] = int(datetime.datetime.now().timestamp() * 1000)
-                        self.db[parent_task_id] = task
+                            task["end_timestamp"] = time.time_ns() // 1_000_000
 
         thread = threading.Thread(target=run_plan, daemon=True)
         self.running_plans[parent_task_id] = thread
@@ -108,8 +106,6 @@ class TaskScheduler:
             result = self._execute_plan_task(plan_task, parent_task_id, task_idx, log_callback)
             task_results[task_idx] = result
 
-            self._update_parent_task_progress(parent_task_id)
-
             has_errors = len(result.get("errors", [])) > 0
             has_success = len(result.get("success", [])) > 0
 
@@ -132,9 +128,10 @@ class TaskScheduler:
             task = self.db.get(parent_task_id)
             if task and not task.get("running"):
                 if "end_timestamp" not in task:
-                    task["end_timestamp"] = int(datetime.datetime.now().timestamp() * 1000)
-                self.db.tag_for_removal(parent_task_id)
+                    task["end_timestamp"] = time.time_ns() // 1_000_000
+                # Tag after the write-back: storing an entry clears its removal tag
                 self.db[parent_task_id] = task
+                self.db.tag_for_removal(parent_task_id)
 
     @staticmethod
     def _build_execution_sequence(plan: Dict[str, Any]) -> List[Dict[str, Any]]:
@@ -207,16 +204,10 @@ class TaskScheduler:
 
             if "if_previous_output_contains" in plan_task and plan_task["if_previous_output_contains"]:
                 search_str = plan_task["if_previous_output_contains"]
-                all_outputs = []
-                for item in prev_result.get("success", []):
-                    if "output" in item:
-                        all_outputs.append(item["output"])
-                for item in prev_result.get("errors", []):
-                    if "output" in item:
-                        all_outputs.append(item["output"])
-
-                combined_output = "\n".join(all_outputs)
-                if search_str not in combined_output:
+                # Scan each output on its own instead of joining them all, stopping at the first match
+                found = any(search_str in item.get("output", "") for item in prev_result.get("success", [])) \
+                    or any(search_str in item.get("output", "") for item in prev_result.get("errors", []))
+                if not found:
                     return False
 
         return True
@@ -228,11 +219,13 @@ class TaskScheduler:
 
         if command_name in self.execution_plans:
             self._execute_plan_sync(command_name, parent_task_id, log_callback)
+            self._update_parent_task_progress(parent_task_id)
             return {"success": [], "errors": [], "running": []}
 
         errors, entries = HostValidator.validate_hosts(hostnames, "command", command_name, self.hosts_config)
 
         if errors:
+            self._update_parent_task_progress(parent_task_id)
             return {
                 "success": [],
                 "errors": errors,
@@ -243,7 +236,7 @@ class TaskScheduler:
 
         task_data = {
             "task_id": sub_task_id,
-            "start_timestamp": int(datetime.datetime.now().timestamp() * 1000),
+            "start_timestamp": time.time_ns() // 1_000_000,
             "command": command_name,
             "success": [],
             "running": [{"hostname": h} for h in hostnames],
@@ -270,30 +263,33 @@ class TaskScheduler:
             "running": task.get("running", [])
         }
 
-        self._update_plan_task_status(parent_task_id, task_idx, "completed")
+        # Completion and progress land in the same write
+        self._update_plan_task_status(parent_task_id, task_idx, "completed", update_progress=True)
 
         return result
 
-    def _update_plan_task_status(self, parent_task_id: str, task_idx: int, status: str) -> None:
-        with self.db.lock:
-            task = self.db.get(parent_task_id)
+    def _update_plan_task_status(self, parent_task_id: str, task_idx: int, status: str, update_progress: bool = False) -> None:
+        with self.db.transaction(parent_task_id) as task:
             if task:
                 if "plan_tasks" not in task:
                     task["plan_tasks"] = {}
                 task["plan_tasks"][str(task_idx)] = {
                     "status": status,
-                    "timestamp": int(datetime.datetime.now().timestamp() * 1000)
+                    "timestamp": time.time_ns() // 1_000_000
                 }
-                self.db[parent_task_id] = task
+                if update_progress:
+                    self._set_progress(task)
 
     def _update_parent_task_progress(self, parent_task_id: str) -> None:
-        with self.db.lock:
-            task = self.db.get(parent_task_id)
+        with self.db.transaction(parent_task_id) as task:
             if task:
-                plan_tasks = task.get("plan_tasks", {})
-                completed = sum(1 for pt in plan_tasks.values() if pt.get("status") == "completed")
-                total = len(plan_tasks)
+                self._set_progress(task)
 
-                task["running"] = [{"hostname": f"Plan progress: {completed}/{total}"}]
-                self.db[parent_task_id] = task
+    @staticmethod
+    def _set_progress(task: Dict[str, Any]) -> None:
+        plan_tasks = task.get("plan_tasks", {})
+        completed = sum(1 for pt in plan_tasks.values() if pt.get("status") == "completed")
+        total = len(plan_tasks)
+
+        task["running"] = [{"hostname": f"Plan progress: {completed}/{total}"}]
 
@@ -2,11 +2,20 @@
 # WEBSOCKET SERVER
 # ============================================================================
 
-import base64, hashlib, hmac, json, logging, os, secrets, signal, socket, ssl, struct, threading, time
+import asyncio, base64, hashlib, hmac, json, logging, os, secrets, signal, ssl, struct, threading, time
 import urllib.parse
 
 logger = logging.getLogger("concierge")
 
+_HEADER_SHORT = struct.Struct(">BBH")
+_HEADER_LONG = struct.Struct(">BBQ")
+
+# Seconds a worker thread waits for one client's frame to flush before dropping that client
+_SEND_TIMEOUT = 5
+
+_MAX_TOKEN_MSG_LENGTH = 512
+_MAX_TOKEN_LENGTH = (_MAX_TOKEN_MSG_LENGTH + 32 + 2) // 3 * 4  # base64 of msg + sig
+
 class WebSocketManager:
     GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
 
@@ -15,24 +24,34 @@ class WebSocketManager:
         self.cert, self.key = cert, key
         self.host, self.port = host, port
         self.token_ttl = token_ttl
-        self.clients = {}  # socket -> (user, task_id, hostname)
+        self.clients = {}  # stream writer -> (user, task_id, hostname)
         self.used_nonces = {}  # nonce -> exp
         self.running = False
         self.process_streams = {}  # (task_id, hostname) -> process
         self.lock = threading.RLock()
+        self._status_messages = {}  # status -> encoded status message
+        self._loop = None  # event loop running serve(), None while stopped
+        self._stopped = None
 
     def issue_token(self, user_id, task_id, hostname):
         exp = int(time.time() + self.token_ttl)
         nonce = secrets.token_urlsafe(16)
         msg = f"{user_id}:{task_id}:{hostname}:{exp}:{nonce}".encode()
-        sig = hmac.new(self.secret, msg, hashlib.sha256).digest()
+        sig = hmac.digest(self.secret, msg, "sha256")
         return base64.urlsafe_b64encode(msg + sig).decode()
 
     def _verify_token(self, token):
+        if len(token) > _MAX_TOKEN_LENGTH:
+            raise ValueError("Malformed token")
+
         raw = base64.urlsafe_b64decode(token.encode())
         msg, sig = raw[:-32], raw[-32:]
 
-        if not hmac.compare_digest(hmac.new(self.secret, msg, hashlib.sha256).digest(), sig):
+        # Cheap structural checks first, no point in hashing junk
+        if len(raw) < 33 or len(msg) > _MAX_TOKEN_MSG_LENGTH or msg.count(b":") != 4:
+            raise ValueError("Malformed token")
+
+        if not hmac.compare_digest(hmac.digest(self.secret, msg, "sha256"), sig):
             raise ValueError("Invalid signature")
 
         parts = msg.decode().split(":")
@@ -53,8 +72,8 @@ class WebSocketManager:
 
         return user, task_id, hostname
 
-    def _handshake(self, sock):
-        req = sock.recv(8192).decode('utf-8', errors='ignore')
+    async def _handshake(self, reader, writer):
+        req = (await reader.readuntil(b"\r\n\r\n")).decode('utf-8', errors='ignore')
 
         path = req.split(" ", 3)[1]
         query = urllib.parse.parse_qs(urllib.parse.urlparse(path).query)
@@ -74,7 +93,7 @@ class WebSocketManager:
             raise ValueError("No WebSocket key")
 
         accept = base64.b64encode(
-            hashlib.sha1((key + self.GUID).encode()).digest()
+            hashlib.sha1((key + self.GUID).encode(), usedforsecurity=False).digest()
         ).decode()
 
         response = (
@@ -84,16 +103,15 @@ class WebSocketManager:
             f"Sec-WebSocket-Accept: {accept}\r\n"
             "Sec-WebSocket-Protocol: concierge.v1\r\n\r\n"
         )
-        sock.send(response.encode())
+        writer.write(response.encode())
+        await writer.drain()
 
         return user, task_id, hostname
 
     @staticmethod
-    def _recv_frame(sock):
+    async def _recv_frame(reader):
         try:
-            header = sock.recv(2)
-            if len(header) < 2:
-                return None, None, None
+            header = await reader.readexactly(2)
 
             b1, b2 = header[0], header[1]
             fin = (b1 >> 7) & 1
@@ -102,24 +120,13 @@ class WebSocketManager:
             length = b2 & 0x7f
 
             if length == 126:
-                length_data = sock.recv(2)
-                if len(length_data) < 2:
-                    return None, None, None
-                length = struct.unpack(">H", length_data)[0]
+                length = struct.unpack(">H", await reader.readexactly(2))[0]
             elif length == 127:
-                length_data = sock.recv(8)
-                if len(length_data) < 8:
-                    return None, None, None
-                length = struct.unpack(">Q", length_data)[0]
+                length = struct.unpack(">Q", await reader.readexactly(8))[0]
 
-            mask_key = sock.recv(4) if masked else None
+            mask_key = await reader.readexactly(4) if masked else None
 
-            payload = b""
-            while len(payload) < length:
-                chunk = sock.recv(min(4096, length - len(payload)))
-                if not chunk:
-                    return None, None, None
-                payload += chunk
+            payload = await reader.readexactly(length)
 
             if masked and mask_key:
                 payload = bytes(b ^ mask_key[i % 4] for i, b in enumerate(payload))
@@ -129,39 +136,73 @@ class WebSocketManager:
             return None, None, None
 
     @staticmethod
-    def _send_frame(sock, payload, opcode=0x02):
-        try:
-            if isinstance(payload, str) or isinstance(payload, int):
-                payload = str(payload).encode('utf-8')
-
-            length = len(payload)
-            header = bytes([0x80 | opcode])
-
-            if length < 126:
-                header += bytes([length])
-            elif length < 65536:
-                header += bytes([126]) + struct.pack(">H", length)
-            else:
-                header += bytes([127]) + struct.pack(">Q", length)
+    def _build_frame(payload, opcode=0x02):
+        if isinstance(payload, str) or isinstance(payload, int):
+            payload = str(payload).encode('utf-8')
+
+        length = len(payload)
+
+        # Single buffer: header packed in place, payload copied right after it
+        if length < 126:
+            header_len = 2
+            frame = bytearray(header_len + length)
+            frame[0] = 0x80 | opcode
+            frame[1] = length
+        elif length < 65536:
+            header_len = _HEADER_SHORT.size
+            frame = bytearray(header_len + length)
+            _HEADER_SHORT.pack_into(frame, 0, 0x80 | opcode, 126, length)
+        else:
+            header_len = _HEADER_LONG.size
+            frame = bytearray(header_len + length)
+            _HEADER_LONG.pack_into(frame, 0, 0x80 | opcode, 127, length)
+
+        frame[header_len:] = payload
+        return frame
 
-            sock.sendall(header + payload)
+    @staticmethod
+    async def _send_frame(writer, payload, opcode=0x02):
+        try:
+            writer.write(WebSocketManager._build_frame(payload, opcode))
+            await writer.drain()
             return True
         except Exception:
             return False
 
     def send_to_client(self, task_id, hostname, data):
+        """Thread safe: hands the frame over to the event loop and waits until it is flushed (up to _SEND_TIMEOUT)"""
+        loop = self._loop
+        if loop is None:
+            return
+
         with self.lock:
-            for sock, (user, tid, host) in self.clients.items():
-                if tid == task_id and host == hostname:
-                    if not self._send_frame(sock, data, 0x02):
-                        self.clients.pop(sock, None)
-                        try:
-                            sock.close()
-                        except Exception:
-                            pass
+            writers = [writer for writer, (user, tid, host) in self.clients.items() if tid == task_id and host == hostname]
+
+        for writer in writers:
+            coro = self._send_frame(writer, data, 0x02)
+            future = None
+            try:
+                future = asyncio.run_coroutine_threadsafe(coro, loop)
+                sent = future.result(_SEND_TIMEOUT)
+            except Exception:
+                if future is None:
+                    coro.close()  # Loop already closed, never scheduled
+                else:
+                    future.cancel()
+                sent = False
+            if not sent:
+                with self.lock:
+                    self.clients.pop(writer, None)
+                if not loop.is_closed():
+                    try:
+                        loop.call_soon_threadsafe(writer.close)
+                    except RuntimeError:
+                        pass  # Closed in the meantime during shutdown
 
     def broadcast_status(self, task_id, hostname, status):
-        msg = json.dumps({"type": "status", "status": status})
+        msg = self._status_messages.get(status)
+        if msg is None:
+            msg = self._status_messages.setdefault(status, json.dumps({"type": "status", "status": status}).encode('utf-8'))
         self.send_to_client(task_id, hostname, msg)
 
     def register_process(self, task_id, hostname, proc):
@@ -172,25 +213,25 @@ class WebSocketManager:
         with self.lock:
             self.process_streams.pop((task_id, hostname), None)
 
-    def _handle_client(self, sock):
+    async def _handle_client(self, reader, writer):
         user, task_id, hostname = None, None, None
         try:
-            user, task_id, hostname = self._handshake(sock)
+            user, task_id, hostname = await self._handshake(reader, writer)
 
             with self.lock:
-                self.clients[sock] = (user, task_id, hostname)
+                self.clients[writer] = (user, task_id, hostname)
 
             logger.info(f"WebSocket connected: task={task_id}, host={hostname}")
 
-            self._send_frame(sock, json.dumps({"type": "connected"}).encode(), 0x01)
+            await self._send_frame(writer, json.dumps({"type": "connected"}).encode(), 0x01)
 
             while True:
-                _, opcode, payload = self._recv_frame(sock)
+                _, opcode, payload = await self._recv_frame(reader)
 
                 if opcode is None or opcode == 0x08:  # Close frame or error
                     break
                 elif opcode == 0x09:  # Ping
-                    self._send_frame(sock, payload, 0x0A)  # Pong
+                    await self._send_frame(writer, payload, 0x0A)  # Pong
                 elif opcode in (0x01, 0x02) and payload:  # Text or binary
                     proc_key = (task_id, hostname)
                     with self.lock:
@@ -216,54 +257,73 @@ class WebSocketManager:
                                     # Not a control message, treat as normal input
                                     pass
 
-                            proc.stdin.write(payload)
-                            proc.stdin.flush()
+                            # A full stdin pipe must not stall the event loop
+                            await asyncio.get_running_loop().run_in_executor(None, self._write_stdin, proc, payload)
                         except Exception as e:
                             logger.error(f"Error writing to stdin: {e}")
+        except asyncio.CancelledError:
+            # Server shutting down
+            pass
         except Exception as e:
             logger.error(f"WebSocket client error: {e}")
         finally:
             with self.lock:
-                if sock in self.clients:
-                    del self.clients[sock]
+                if writer in self.clients:
+                    del self.clients[writer]
             try:
-                sock.close()
+                writer.close()
             except Exception:
                 pass
             logger.info(f"WebSocket disconnected: task={task_id}, host={hostname}")
 
+    @staticmethod
+    def _write_stdin(proc, payload):
+        proc.stdin.write(payload)
+        proc.stdin.flush()
+
     def serve(self):
+        """Blocking: runs the WebSocket event loop in the calling thread until stop() is called"""
         self.running = True
-        server_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        server_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        server_sock.bind((self.host, self.port))
-        server_sock.listen(5)
+        try:
+            asyncio.run(self._serve())
+        finally:
+            self._loop = None
 
+    async def _serve(self):
         ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
         ctx.load_cert_chain(self.cert, self.key)
 
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        if not self.running:  # stop() was called before the loop was up
+            self._stopped.set()
+
+        server = await asyncio.start_server(self._handle_client, self.host, self.port, ssl=ctx, reuse_address=True)
+
         logger.info(f"WebSocket server listening on {self.host}:{self.port}")
 
-        while self.running:
-            try:
-                client_sock, _ = server_sock.accept()
-                client_sock = ctx.wrap_socket(client_sock, server_side=True)
-                threading.Thread(target=self._handle_client, args=(client_sock,), daemon=True).start()
-            except Exception as e:
-                if self.running:
-                    logger.error(f"WebSocket accept error: {e}")
+        async with server:
+            await self._stopped.wait()
 
-        try:
-            server_sock.close()
-        except Exception:
-            pass
+        # Wind down client handlers so they clean up before the loop goes away
+        handlers = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in handlers:
+            task.cancel()
+        if handlers:
+            await asyncio.wait(handlers)
 
-    def stop(self):
-        self.running = False
+    def _shutdown(self):
         with self.lock:
-            for sock in self.clients.keys():
+            for writer in self.clients.keys():
                 try:
-                    sock.close()
+                    writer.close()
                 except Exception:
                     pass
-            self.clients.clear()
\ No newline at end of file
+            self.clients.clear()
+        self._stopped.set()
+
+    def stop(self):
+        self.running = False
+        loop = self._loop
+        if loop is not None:
+            loop.call_soon_threadsafe(self._shutdown)
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Sources are plain modules (no package install): make them importable once for the whole suite
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'concierge_acpi'))
+
+# RAM backed temp dirs for fixtures when available
+TMP_BASE = '/dev/shm' if os.path.isdir('/dev/shm') else None
@@ -1,20 +1,107 @@
 import unittest
 import tempfile
+import shutil
 import os
-import sys
 import json
+import logging
+import re
 
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + '/concierge_acpi')
-
+from config_validation import validate_config_schema
 from configuration import ConciergeConfig
+from tests import TMP_BASE
+
+_OPTION_RE = re.compile(r'value="(health|status)"')
+
+
+class _ListHandler(logging.Handler):
+    def __init__(self, records):
+        super().__init__()
+        self.records = records
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def _write_json(path, obj):
+    with open(path, 'wb') as f:
+        f.write(json.dumps(obj).encode('utf-8'))
+
+
+# Variant configs for the validation tests, handed over already parsed
+_BASE_HTTP_CMD = {"name": "test", "type": "http", "url": "https://example.com", "timeout": 30}
+
+
+def _host(commands, hostname="server1"):
+    return {"hostname": hostname, "commands": commands}
+
+
+_CONFLICT_CFG = [_host([{
+    **_BASE_HTTP_CMD,
+    "payload": "SGVsbG8=",
+    "payload_base64_encoded": True,
+    "payload_placeholder_replacement": "json_only"
+}])]
+
+_UNSAFE_CFG = [_host([{
+    **_BASE_HTTP_CMD,
+    "payload": '{"key": "<value>"}',
+    "payload_placeholder_replacement": "very_unsafe"
+}])]
+
+_JSON_ONLY_CFG = [_host([{
+    **_BASE_HTTP_CMD,
+    "payload": '{"key": <string_value>}',
+    "payload_placeholder_replacement": "json_only"
+}])]
+
+_DISABLED_CFG = [_host([{
+    **_BASE_HTTP_CMD,
+    "payload": '{"key": "value"}',
+    "payload_placeholder_replacement": "disabled"
+}])]
+
+_DEFAULT_CFG = [_host([{**_BASE_HTTP_CMD, "payload": '{"key": "value"}'}])]
+
+_BASE64_OK_CFG = [_host([{
+    **_BASE_HTTP_CMD,
+    "payload": "SGVsbG8=",
+    "payload_base64_encoded": True,
+    "payload_placeholder_replacement": "disabled"
+}])]
+
+_SHELL_CFG = [_host([{"name": "test", "type": "shell", "command": "echo", "timeout": 30}])]
+
+_MULTI_CFG = [
+    _host([{
+        **_BASE_HTTP_CMD,
+        "name": "test1",
+        "payload": '{"key": "value"}',
+        "payload_placeholder_replacement": "very_unsafe"
+    }]),
+    _host([{
+        **_BASE_HTTP_CMD,
+        "name": "test2",
+        "payload": '{"key": <string_key>}',
+        "payload_placeholder_replacement": "json_only"
+    }], hostname="server2")
+]
+
+# Configs that must load without raising or logging warnings
+_ACCEPTED_CASES = [
+    ("disabled_replacement", _DISABLED_CFG),
+    ("default_disabled_replacement", _DEFAULT_CFG),
+    ("base64_enabled_disabled_replacement", _BASE64_OK_CFG),
+    ("non_http_command_ignored", _SHELL_CFG),
+]
 
 
 class TestConciergeConfig(unittest.TestCase):
-    def setUp(self):
-        self.temp_dir = tempfile.mkdtemp()
+    @classmethod
+    def setUpClass(cls):
+        cls.temp_dir = tempfile.mkdtemp(dir=TMP_BASE)
         
         # Create config file
-        self.config_data = [
+        cls.config_data = [
             {
                 "hostname": "server1",
                 "mac": "11:22:33:44:55:66",
@@ -49,27 +136,45 @@ class TestConciergeConfig(unittest.TestCase):
             }
         ]
         
-        self.config_file = os.path.join(self.temp_dir, "config.json")
-        with open(self.config_file, 'w') as f:
-            json.dump(self.config_data, f)
+        cls.config_file = os.path.join(cls.temp_dir, "config.json")
+        _write_json(cls.config_file, cls.config_data)
         
         # Create template file
-        self.template_file = os.path.join(self.temp_dir, "template.html")
-        with open(self.template_file, 'w') as f:
+        cls.template_file = os.path.join(cls.temp_dir, "template.html")
+        with open(cls.template_file, 'w') as f:
             f.write("<html>{HOST_OPTIONS}{COMMAND_OPTIONS}</html>")
         
         # Create API spec file
-        self.api_spec_file = os.path.join(self.temp_dir, "api_spec.yaml")
-        with open(self.api_spec_file, 'w') as f:
+        cls.api_spec_file = os.path.join(cls.temp_dir, "api_spec.yaml")
+        with open(cls.api_spec_file, 'w') as f:
             f.write("openapi: 3.0.0\ninfo:\n  title: Test API")
 
+        # Shared instances for tests that only read from the loaded config
+        cls.default_config = ConciergeConfig(cls.config_file, cls.template_file)
+        cls.default_config_with_api = ConciergeConfig(cls.config_file, cls.template_file, cls.api_spec_file)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.temp_dir, ignore_errors=True)
+
+    def setUp(self):
+        self.log_records = []
+        self.logger = logging.getLogger("concierge")
+        self._log_state = self.logger.level, self.logger.propagate
+        self.log_handler = _ListHandler(self.log_records)
+        self.logger.addHandler(self.log_handler)
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+
     def tearDown(self):
-        for file in os.listdir(self.temp_dir):
-            os.remove(os.path.join(self.temp_dir, file))
-        os.rmdir(self.temp_dir)
+        self.logger.removeHandler(self.log_handler)
+        self.logger.level, self.logger.propagate = self._log_state
+
+    def _log_messages(self, level):
+        return [r.getMessage() for r in self.log_records if r.levelno >= level]
 
     def test_init_loads_config(self):
-        config = ConciergeConfig(self.config_file, self.template_file)
+        config = self.default_config
         
         self.assertEqual(len(config.config), 2)
         self.assertIn("server1", config.hosts)
@@ -87,22 +192,18 @@ class TestConciergeConfig(unittest.TestCase):
             "execution_plans": []
         }
         
-        dict_config_file = os.path.join(self.temp_dir, "dict_config.json")
-        with open(dict_config_file, 'w') as f:
-            json.dump(dict_config, f)
-        
-        config = ConciergeConfig(dict_config_file, self.template_file)
+        config = ConciergeConfig(None, self.template_file, config_obj=dict_config)
         self.assertEqual(len(config.config), 2)
         self.assertEqual(len(config.execution_plans), 0)
 
     def test_hosts_dictionary_created(self):
-        config = ConciergeConfig(self.config_file, self.template_file)
+        config = self.default_config
         
         self.assertEqual(config.hosts["server1"]["mac"], "11:22:33:44:55:66")
         self.assertEqual(config.hosts["server2"]["mac"], "aa:bb:cc:dd:ee:ff")
 
     def test_commands_dictionary_created(self):
-        config = ConciergeConfig(self.config_file, self.template_file)
+        config = self.default_config
         
         self.assertIn("status", config.commands)
         self.assertIn("health", config.commands)
@@ -110,67 +211,68 @@ class TestConciergeConfig(unittest.TestCase):
         self.assertEqual(config.commands["health"]["type"], "http")
 
     def test_html_template_loaded(self):
-        config = ConciergeConfig(self.config_file, self.template_file)
+        config = self.default_config
         
         self.assertIsNotNone(config.html)
         self.assertNotIn("{HOST_OPTIONS}", config.html)
         self.assertNotIn("{COMMAND_OPTIONS}", config.html)
 
     def test_html_contains_host_options(self):
-        config = ConciergeConfig(self.config_file, self.template_file)
+        config = self.default_config
         
         self.assertIn("server1", config.html)
         self.assertIn("server2", config.html)
         self.assertIn('data-host="server1"', config.html)
 
     def test_html_contains_command_options(self):
-        config = ConciergeConfig(self.config_file, self.template_file)
+        config = self.default_config
         
         self.assertIn('value="health"', config.html)
         self.assertIn('value="status"', config.html)
 
     def test_api_spec_loaded(self):
-        config = ConciergeConfig(self.config_file, self.template_file, self.api_spec_file)
+        config = self.default_config_with_api
         
         self.assertIsNotNone(config.api_spec)
         self.assertIn("openapi", config.api_spec)
 
     def test_api_spec_none_when_not_provided(self):
-        config = ConciergeConfig(self.config_file, self.template_file)
+        config = self.default_config
         
         self.assertIsNone(config.api_spec)
 
     def test_commands_sorted_in_html(self):
-        config = ConciergeConfig(self.config_file, self.template_file)
+        config = self.default_config
         
-        # Find positions of command options in HTML
-        health_pos = config.html.find('value="health"')
-        status_pos = config.html.find('value="status"')
+        # Find positions of command options in HTML, single pass
+        positions = {m.group(1): m.start() for m in _OPTION_RE.finditer(config.html)}
         
         # health should come before status alphabetically
-        self.assertLess(health_pos, status_pos)
+        self.assertLess(positions["health"], positions["status"])
 
     def test_config_path_stored(self):
-        config = ConciergeConfig(self.config_file, self.template_file)
+        config = self.default_config
         
         self.assertEqual(config.config_path, self.config_file)
 
     def test_template_path_stored(self):
-        config = ConciergeConfig(self.config_file, self.template_file)
+        config = self.default_config
         
         self.assertEqual(config.template_path, self.template_file)
 
     def test_api_spec_path_stored(self):
-        config = ConciergeConfig(self.config_file, self.template_file, self.api_spec_file)
+        config = self.default_config_with_api
         
         self.assertEqual(config.api_spec_path, self.api_spec_file)
 
+    def test_config_obj_kept_on_refresh(self):
+        config = ConciergeConfig(None, self.template_file, config_obj=self.config_data)
+
+        self.assertIsNone(config.config_path)
+        self.assertIn('data-host="server2"', config.process_template_file())
+
     def test_empty_config(self):
-        empty_config_file = os.path.join(self.temp_dir, "empty_config.json")
-        with open(empty_config_file, 'w') as f:
-            json.dump([], f)
-        
-        config = ConciergeConfig(empty_config_file, self.template_file)
+        config = ConciergeConfig(None, self.template_file, config_obj=[])
         
         self.assertEqual(len(config.hosts), 0)
         self.assertEqual(len(config.commands), 0)
@@ -183,11 +285,7 @@ class TestConciergeConfig(unittest.TestCase):
             }
         ]
         
-        config_file = os.path.join(self.temp_dir, "config2.json")
-        with open(config_file, 'w') as f:
-            json.dump(config_data, f)
-        
-        config = ConciergeConfig(config_file, self.template_file)
+        config = ConciergeConfig(None, self.template_file, config_obj=config_data)
         
         self.assertEqual(len(config.commands), 0)
         self.assertIn("server1", config.hosts)
@@ -203,11 +301,7 @@ class TestConciergeConfig(unittest.TestCase):
             }
         ]
         
-        config_file = os.path.join(self.temp_dir, "config3.json")
-        with open(config_file, 'w') as f:
-            json.dump(config_data, f)
-        
-        config = ConciergeConfig(config_file, self.template_file)
+        config = ConciergeConfig(None, self.template_file, config_obj=config_data)
         
         # setdefault should keep the first occurrence
         self.assertEqual(config.commands["status"]["type"], "shell")
@@ -220,217 +314,46 @@ class TestConciergeConfig(unittest.TestCase):
             }
         ]
         
-        config_file = os.path.join(self.temp_dir, "config4.json")
-        with open(config_file, 'w') as f:
-            json.dump(config_data, f)
-        
-        config = ConciergeConfig(config_file, self.template_file)
+        config = ConciergeConfig(None, self.template_file, config_obj=config_data)
         
         self.assertIn("server<1>", config.html)
 
+    @staticmethod
+    def _validate(config_data):
+        # Schema check plus the HTTP command checks ConciergeConfig runs on load, minus template/HTML work
+        validate_config_schema(config_data)
+        ConciergeConfig._validate_http_commands(config_data)
+
     def test_validation_conflicting_base64_and_replacement(self):
-        config_data = [
-            {
-                "hostname": "server1",
-                "commands": [{
-                    "name": "test",
-                    "type": "http",
-                    "url": "https://example.com",
-                    "payload": "SGVsbG8=",
-                    "payload_base64_encoded": True,
-                    "payload_placeholder_replacement": "json_only",
-                    "timeout": 30
-                }]
-            }
-        ]
-        
-        config_file = os.path.join(self.temp_dir, "config_conflict.json")
-        with open(config_file, 'w') as f:
-            json.dump(config_data, f)
-        
         with self.assertRaises(ValueError) as context:
-            ConciergeConfig(config_file, self.template_file)
-            self.assertIn("Cannot use payload_placeholder_replacement with payload_base64_encoded", str(context.exception))
+            ConciergeConfig._validate_http_commands(_CONFLICT_CFG)
+        self.assertIn("Cannot use payload_placeholder_replacement with payload_base64_encoded", str(context.exception))
 
     def test_validation_very_unsafe_warning(self):
-        config_data = [
-            {
-                "hostname": "server1",
-                "commands": [{
-                    "name": "test",
-                    "type": "http",
-                    "url": "https://example.com",
-                    "payload": '{"key": "<value>"}',
-                    "payload_placeholder_replacement": "very_unsafe",
-                    "timeout": 30
-                }]
-            }
-        ]
-        
-        config_file = os.path.join(self.temp_dir, "config_unsafe.json")
-        with open(config_file, 'w') as f:
-            json.dump(config_data, f)
-        
-        import logging
-        with self.assertLogs(level=logging.WARNING) as log:
-            config = ConciergeConfig(config_file, self.template_file)
-        
-        self.assertTrue(any("very_unsafe" in message for message in log.output))
-        self.assertTrue(any("can be abused" in message for message in log.output))
+        self._validate(_UNSAFE_CFG)
+        messages = self._log_messages(logging.WARNING)
 
-    def test_validation_json_only_info(self):
-        config_data = [
-            {
-                "hostname": "server1",
-                "commands": [{
-                    "name": "test",
-                    "type": "http",
-                    "url": "https://example.com",
-                    "payload": '{"key": <string_value>}',
-                    "payload_placeholder_replacement": "json_only",
-                    "timeout": 30
-                }]
-            }
-        ]
-        
-        config_file = os.path.join(self.temp_dir, "config_json_only.json")
-        with open(config_file, 'w') as f:
-            json.dump(config_data, f)
-        
-        import logging
-        with self.assertLogs(level=logging.INFO) as log:
-            config = ConciergeConfig(config_file, self.template_file)
-        
-        self.assertTrue(any("json_only" in message for message in log.output))
+        self.assertTrue(any("very_unsafe" in message for message in messages))
+        self.assertTrue(any("can be abused" in message for message in messages))
 
-    def test_validation_disabled_no_warning(self):
-        config_data = [
-            {
-                "hostname": "server1",
-                "commands": [{
-                    "name": "test",
-                    "type": "http",
-                    "url": "https://example.com",
-                    "payload": '{"key": "value"}',
-                    "payload_placeholder_replacement": "disabled",
-                    "timeout": 30
-                }]
-            }
-        ]
-        
-        config_file = os.path.join(self.temp_dir, "config_disabled.json")
-        with open(config_file, 'w') as f:
-            json.dump(config_data, f)
-        
-        # Should not log any warnings
-        config = ConciergeConfig(config_file, self.template_file)
-        self.assertIsNotNone(config)
+    def test_validation_json_only_info(self):
+        self._validate(_JSON_ONLY_CFG)
+        messages = self._log_messages(logging.INFO)
 
-    def test_validation_default_disabled_no_warning(self):
-        config_data = [
-            {
-                "hostname": "server1",
-                "commands": [{
-                    "name": "test",
-                    "type": "http",
-                    "url": "https://example.com",
-                    "payload": '{"key": "value"}',
-                    "timeout": 30
-                }]
-            }
-        ]
-        
-        config_file = os.path.join(self.temp_dir, "config_default.json")
-        with open(config_file, 'w') as f:
-            json.dump(config_data, f)
-        
-        # Should not log any warnings (defaults to disabled)
-        config = ConciergeConfig(config_file, self.template_file)
-        self.assertIsNotNone(config)
+        self.assertTrue(any("json_only" in message for message in messages))
 
-    def test_validation_base64_enabled_disabled_replacement_ok(self):
-        config_data = [
-            {
-                "hostname": "server1",
-                "commands": [{
-                    "name": "test",
-                    "type": "http",
-                    "url": "https://example.com",
-                    "payload": "SGVsbG8=",
-                    "payload_base64_encoded": True,
-                    "payload_placeholder_replacement": "disabled",
-                    "timeout": 30
-                }]
-            }
-        ]
-        
-        config_file = os.path.join(self.temp_dir, "config_base64_ok.json")
-        with open(config_file, 'w') as f:
-            json.dump(config_data, f)
-        
-        # Should not raise error
-        config = ConciergeConfig(config_file, self.template_file)
-        self.assertIsNotNone(config)
-
-    def test_validation_non_http_command_ignored(self):
-        config_data = [
-            {
-                "hostname": "server1",
-                "commands": [{
-                    "name": "test",
-                    "type": "shell",
-                    "command": "echo",
-                    "timeout": 30
-                }]
-            }
-        ]
-        
-        config_file = os.path.join(self.temp_dir, "config_shell.json")
-        with open(config_file, 'w') as f:
-            json.dump(config_data, f)
-        
-        # Should not validate shell commands
-        config = ConciergeConfig(config_file, self.template_file)
-        self.assertIsNotNone(config)
+    def test_validation_accepted_without_warning(self):
+        for name, config_data in _ACCEPTED_CASES:
+            with self.subTest(name=name):
+                self.log_records.clear()
+                # Should not raise
+                self._validate(config_data)
+                self.assertEqual(self._log_messages(logging.WARNING), [])
 
     def test_validation_multiple_hosts(self):
-        config_data = [
-            {
-                "hostname": "server1",
-                "commands": [{
-                    "name": "test1",
-                    "type": "http",
-                    "url": "https://example.com",
-                    "payload": '{"key": "value"}',
-                    "payload_placeholder_replacement": "very_unsafe",
-                    "timeout": 30
-                }]
-            },
-            {
-                "hostname": "server2",
-                "commands": [{
-                    "name": "test2",
-                    "type": "http",
-                    "url": "https://example.com",
-                    "payload": '{"key": <string_key>}',
-                    "payload_placeholder_replacement": "json_only",
-                    "timeout": 30
-                }]
-            }
-        ]
-        
-        config_file = os.path.join(self.temp_dir, "config_multi.json")
-        with open(config_file, 'w') as f:
-            json.dump(config_data, f)
-        
-        import logging
-        with self.assertLogs(level=logging.INFO) as log:
-            config = ConciergeConfig(config_file, self.template_file)
-        
-        # Should log warnings/info for both
-        self.assertTrue(any("server1" in message and "very_unsafe" in message for message in log.output))
-        self.assertTrue(any("server2" in message and "json_only" in message for message in log.output))
-
+        self._validate(_MULTI_CFG)
+        messages = self._log_messages(logging.INFO)
 
-if __name__ == '__main__':
-    unittest.main()
+        # Should log warnings/info for both
+        self.assertTrue(any("server1" in message and "very_unsafe" in message for message in messages))
+        self.assertTrue(any("server2" in message and "json_only" in message for message in messages))
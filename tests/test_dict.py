@@ -1,31 +1,31 @@
 import unittest
 import tempfile
+import shutil
 import os
-import sys
 import json
 import threading
-
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + '/concierge_acpi')
+import time
 
 from persistent_dictionary import OptionallyPersistentOrderedThreadSafeDict, FullDictionaryError
+from tests import TMP_BASE
 
 
 class TestOptionallyPersistentOrderedThreadSafeDict(unittest.TestCase):
     def setUp(self):
-        self.temp_dir = tempfile.mkdtemp()
+        self.temp_dir = tempfile.mkdtemp(dir=TMP_BASE)
         self.temp_file = os.path.join(self.temp_dir, "test_db")
+        self._dicts = []
 
     def tearDown(self):
-        # Clean up temp files
-        for file in os.listdir(self.temp_dir):
-            try:
-                os.remove(os.path.join(self.temp_dir, file))
-            except Exception:
-                pass
-        try:
-            os.rmdir(self.temp_dir)
-        except Exception:
-            pass
+        # Stop background flushers before their files go away
+        for d in self._dicts:
+            d.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _open(self, *args, **kwargs):
+        d = OptionallyPersistentOrderedThreadSafeDict(self.temp_file, *args, **kwargs)
+        self._dicts.append(d)
+        return d
 
     def test_init_in_memory(self):
         d = OptionallyPersistentOrderedThreadSafeDict()
@@ -33,7 +33,7 @@ class TestOptionallyPersistentOrderedThreadSafeDict(unittest.TestCase):
         self.assertIsNone(d._filepath)
 
     def test_init_with_file(self):
-        d = OptionallyPersistentOrderedThreadSafeDict(self.temp_file, 10)
+        d = self._open(10)
         self.assertEqual(len(d), 0)
         self.assertEqual(d._filepath, self.temp_file)
         self.assertEqual(d._max_size, 10)
@@ -45,12 +45,13 @@ class TestOptionallyPersistentOrderedThreadSafeDict(unittest.TestCase):
         self.assertEqual(len(d), 1)
 
     def test_setitem_persistent(self):
-        d = OptionallyPersistentOrderedThreadSafeDict(self.temp_file)
+        d = self._open()
         d["key1"] = "value1"
         self.assertEqual(d["key1"], "value1")
+        d.flush()
         
         # Verify persistence
-        d2 = OptionallyPersistentOrderedThreadSafeDict(self.temp_file)
+        d2 = self._open()
         self.assertEqual(d2["key1"], "value1")
 
     def test_update_existing_key(self):
@@ -73,11 +74,12 @@ class TestOptionallyPersistentOrderedThreadSafeDict(unittest.TestCase):
         self.assertNotIn("key1", d)
 
     def test_delitem_persistent(self):
-        d = OptionallyPersistentOrderedThreadSafeDict(self.temp_file)
+        d = self._open()
         d["key1"] = "value1"
         del d["key1"]
+        d.flush()
         
-        d2 = OptionallyPersistentOrderedThreadSafeDict(self.temp_file)
+        d2 = self._open()
         self.assertNotIn("key1", d2)
 
     def test_contains(self):
@@ -162,11 +164,12 @@ class TestOptionallyPersistentOrderedThreadSafeDict(unittest.TestCase):
         self.assertIn("key1", d._tagged_for_removal)
 
     def test_tag_for_removal_persistent(self):
-        d = OptionallyPersistentOrderedThreadSafeDict(self.temp_file)
+        d = self._open()
         d["key1"] = "value1"
         d.tag_for_removal("key1")
+        d.flush()
         
-        d2 = OptionallyPersistentOrderedThreadSafeDict(self.temp_file)
+        d2 = self._open()
         self.assertIn("key1", d2._tagged_for_removal)
 
     def test_max_size_enforcement(self):
@@ -189,6 +192,19 @@ class TestOptionallyPersistentOrderedThreadSafeDict(unittest.TestCase):
         with self.assertRaises(FullDictionaryError):
             d["key3"] = "value3"
 
+    def test_max_size_evicts_first_tagged(self):
+        d = OptionallyPersistentOrderedThreadSafeDict(None, 3)
+        d["key1"] = "value1"
+        d["key2"] = "value2"
+        d["key3"] = "value3"
+        d.tag_for_removal("key3")
+        d.tag_for_removal("key1")
+        d["key4"] = "value4"  # Should remove key3, tagged first
+
+        self.assertNotIn("key3", d)
+        self.assertIn("key1", d)
+        self.assertEqual(list(d._tagged_for_removal), ["key1"])
+
     def test_untagging_on_update(self):
         d = OptionallyPersistentOrderedThreadSafeDict()
         d["key1"] = "value1"
@@ -198,6 +214,37 @@ class TestOptionallyPersistentOrderedThreadSafeDict(unittest.TestCase):
         d["key1"] = "value2"  # Update should untag
         self.assertNotIn("key1", d._tagged_for_removal)
 
+    def test_transaction_stores_mutation_persistent(self):
+        d = self._open()
+        d["key1"] = {"items": []}
+        d["key2"] = {"items": []}
+
+        with d.transaction("key1") as value:
+            value["items"].append(1)
+
+        self.assertEqual(d["key1"], {"items": [1]})
+        self.assertEqual(d.keys(), ["key2", "key1"])
+
+    def test_transaction_missing_key(self):
+        d = self._open()
+
+        with d.transaction("missing") as value:
+            self.assertIsNone(value)
+
+        self.assertNotIn("missing", d)
+        self.assertEqual(len(d), 0)
+
+    def test_transaction_not_stored_on_error(self):
+        d = self._open()
+        d["key1"] = {"items": []}
+
+        with self.assertRaises(RuntimeError):
+            with d.transaction("key1") as value:
+                value["items"].append(1)
+                raise RuntimeError("boom")
+
+        self.assertEqual(d["key1"], {"items": []})
+
     def test_thread_safety(self):
         d = OptionallyPersistentOrderedThreadSafeDict()
         errors = []
@@ -221,22 +268,83 @@ class TestOptionallyPersistentOrderedThreadSafeDict(unittest.TestCase):
         self.assertEqual(len(errors), 0)
         self.assertEqual(len(d), 50)
 
+    def test_thread_safety_with_concurrent_flushes(self):
+        d = self._open(compact_threshold=7)
+        errors = []
+
+        def writer(key_range):
+            try:
+                for i in key_range:
+                    d[f"key{i}"] = f"value{i}"
+                    d.flush()
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=writer, args=(range(i*10, (i+1)*10),)) for i in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        d.flush()
+
+        self.assertEqual(len(errors), 0)
+        d2 = self._open()
+        self.assertEqual(d2.keys(), d.keys())
+        self.assertEqual(len(d2), 50)
+
+    def test_mutations_not_blocked_by_queued_flushes(self):
+        d = self._open(flush_interval=60)
+        append_log = d._append_log
+        release = threading.Event()
+        writing = threading.Event()
+
+        def slow_append_log(ops):
+            if not writing.is_set():
+                writing.set()
+                release.wait(5)
+            append_log(ops)
+        d._append_log = slow_append_log
+
+        d["key1"] = "value1"
+        first = threading.Thread(target=d.flush)
+        first.start()
+        self.assertTrue(writing.wait(5))
+        d["key2"] = "value2"
+        second = threading.Thread(target=d.flush)  # Queues behind the stalled write
+        second.start()
+
+        done = threading.Event()
+
+        def mutate():
+            d["key3"] = "value3"
+            done.set()
+        threading.Thread(target=mutate).start()
+        self.assertTrue(done.wait(2))
+
+        release.set()
+        first.join(5)
+        second.join(5)
+        with open(f"{self.temp_file}_metadata.log") as fp:
+            self.assertEqual([json.loads(line)[1] for line in fp], ["key1", "key2"])
+
     def test_persistence_after_reload(self):
-        d1 = OptionallyPersistentOrderedThreadSafeDict(self.temp_file)
+        d1 = self._open()
         d1["key1"] = {"data": "value1"}
         d1["key2"] = {"data": "value2"}
         d1.tag_for_removal("key1")
+        d1.flush()
         
         # Reload
-        d2 = OptionallyPersistentOrderedThreadSafeDict(self.temp_file)
+        d2 = self._open()
         self.assertEqual(d2["key1"], {"data": "value1"})
         self.assertEqual(d2["key2"], {"data": "value2"})
         self.assertEqual(d2.keys(), ["key1", "key2"])
         self.assertIn("key1", d2._tagged_for_removal)
 
     def test_metadata_file_creation(self):
-        d = OptionallyPersistentOrderedThreadSafeDict(self.temp_file)
+        d = self._open()
         d["key1"] = "value1"
+        d.compact()
         
         metadata_file = f"{self.temp_file}_metadata.json"
         self.assertTrue(os.path.exists(metadata_file))
@@ -245,12 +353,95 @@ class TestOptionallyPersistentOrderedThreadSafeDict(unittest.TestCase):
             metadata = json.load(f)
         self.assertEqual(metadata['order'], ["key1"])
 
+    def test_metadata_flushed_in_background(self):
+        d = self._open(flush_interval=0.01)
+        d["key1"] = "value1"
+        d["key2"] = "value2"
+
+        log_file = f"{self.temp_file}_metadata.log"
+        for _ in range(100):
+            with open(log_file, 'r') as f:
+                if [json.loads(line) for line in f] == [["set", "key1"], ["set", "key2"]]:
+                    break
+            time.sleep(0.01)
+        else:
+            self.fail("metadata not flushed")
+
+    def test_flusher_exits_when_idle(self):
+        d = self._open(flush_interval=0.01)
+        d["key1"] = "value1"
+        flusher = d._flusher
+        self.assertIsNotNone(flusher)
+        flusher.join(5)
+
+        self.assertFalse(flusher.is_alive())
+        self.assertIsNone(d._flusher)
+        d["key2"] = "value2"
+        self.assertIsNotNone(d._flusher)
+
+    def test_close_stops_flusher_and_compacts(self):
+        d = self._open(flush_interval=60)
+        d["key1"] = "value1"
+        flusher = d._flusher
+
+        started = time.monotonic()
+        d.close()
+
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertFalse(flusher.is_alive())
+        with open(f"{self.temp_file}_metadata.json") as fp:
+            self.assertEqual(json.load(fp)["order"], ["key1"])
+        self.assertEqual(os.path.getsize(f"{self.temp_file}_metadata.log"), 0)
+        d["key2"] = "value2"
+        self.assertIsNone(d._flusher)
+
+    def test_metadata_log_replayed_on_reload(self):
+        d1 = self._open()
+        d1["key1"] = "value1"
+        d1["key2"] = "value2"
+        d1["key3"] = "value3"
+        del d1["key2"]
+        d1["key1"] = "value1b"
+        d1.tag_for_removal("key3")
+        d1.flush()
+
+        with open(f"{self.temp_file}_metadata.json", 'r') as f:
+            self.assertEqual(json.load(f)['order'], [])
+
+        d2 = self._open()
+        self.assertEqual(d2.keys(), ["key3", "key1"])
+        self.assertIn("key3", d2._tagged_for_removal)
+        # Reload compacts the log into the snapshot
+        self.assertEqual(os.path.getsize(f"{self.temp_file}_metadata.log"), 0)
+
+    def test_reload_recovers_keys_missing_from_metadata(self):
+        d1 = self._open(flush_interval=60)
+        d1["key1"] = "value1"
+        d1.flush()
+        d1["key2"] = "value2"  # In the shelve, metadata not yet written: a crash here loses the op
+
+        d2 = self._open()
+        self.assertEqual(d2.keys(), ["key1", "key2"])
+        d2["key2"] = "value2b"
+        self.assertEqual(d2.keys(), ["key1", "key2"])
+        self.assertEqual(d2["key2"], "value2b")
+
+    def test_metadata_log_compacted_at_threshold(self):
+        d = self._open(compact_threshold=3)
+        d["key1"] = "value1"
+        d["key2"] = "value2"
+        d.flush()
+        with open(f"{self.temp_file}_metadata.log", 'r') as f:
+            self.assertEqual(len(f.readlines()), 2)
+        d["key3"] = "value3"
+        d.flush()
+
+        self.assertEqual(os.path.getsize(f"{self.temp_file}_metadata.log"), 0)
+        with open(f"{self.temp_file}_metadata.json", 'r') as f:
+            self.assertEqual(json.load(f)['order'], ["key1", "key2", "key3"])
+
     def test_get_exception_handling(self):
         d = OptionallyPersistentOrderedThreadSafeDict()
         # Should return default without raising exception
         result = d.get("nonexistent", "default")
         self.assertEqual(result, "default")
-
-
-if __name__ == '__main__':
-    unittest.main()
@@ -1,12 +1,9 @@
 import unittest
 from unittest.mock import patch
-import sys
-import os
 
 from main_utils import recover_dropped_tasks, setup_logging
 from persistent_dictionary import OptionallyPersistentOrderedThreadSafeDict
 
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + '/concierge_acpi')
 
 class TestHelperFunctions(unittest.TestCase):
     def test_recover_dropped_tasks(self):
@@ -55,6 +52,14 @@ class TestHelperFunctions(unittest.TestCase):
         self.assertEqual(len(task["running"]), 0)
         self.assertEqual(len(task["errors"]), 0)
 
+    def test_recover_dropped_tasks_retags_finished_task(self):
+        db = OptionallyPersistentOrderedThreadSafeDict()
+        db["done"] = {"task_id": "done", "success": [{"hostname": "server1"}], "running": [], "errors": []}
+
+        recover_dropped_tasks(db)
+
+        self.assertIn("done", db._tagged_for_removal)
+
     @patch('logging.basicConfig')
     def test_setup_logging(self, mock_basic_config):
         setup_logging("DEBUG")
@@ -72,6 +77,10 @@ class TestHelperFunctions(unittest.TestCase):
         call_kwargs = mock_basic_config.call_args[1]
         self.assertEqual(call_kwargs['level'], 20)  # logging.INFO = 20
 
+    @patch('logging.basicConfig')
+    def test_setup_logging_non_level_attribute(self, mock_basic_config):
+        # logging module attributes that are not level names must not leak through
+        setup_logging("basic_format")
 
-if __name__ == '__main__':
-    unittest.main()
+        call_kwargs = mock_basic_config.call_args[1]
+        self.assertEqual(call_kwargs['level'], 20)
@@ -1,8 +1,4 @@
 import unittest
-import sys
-import os
-
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + '/concierge_acpi')
 
 from request_validator import HostValidator
 
@@ -253,7 +249,3 @@ class TestHostValidator(unittest.TestCase):
         cmd, timeout, is_sync = cmd_data
         self.assertEqual(timeout, -1)
         self.assertFalse(is_sync)
-
-
-if __name__ == '__main__':
-    unittest.main()
@@ -1,11 +1,11 @@
 import unittest
 from unittest.mock import MagicMock, patch
-import sys
-import os
-
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + '/concierge_acpi')
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 from persistent_dictionary import OptionallyPersistentOrderedThreadSafeDict
+import task_executor
 from task_executor import HTTPProcess
 
 class TestHTTPProcess(unittest.TestCase):
@@ -22,6 +22,20 @@ class TestHTTPProcess(unittest.TestCase):
             "errors": [],
             "start_timestamp": 1234567890
         }
+        task_executor._HTTP_POOL.clear()
+        # Mocked pooled sockets read as idle and alive
+        patcher = patch("task_executor.select.select", return_value=([], [], []))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _mock_connection(self, will_close=False):
+        mock_conn = MagicMock()
+        mock_response = MagicMock()
+        mock_response.status = 200
+        mock_response.read.return_value = b'OK'
+        mock_response.will_close = will_close
+        mock_conn.getresponse.return_value = mock_response
+        return mock_conn
 
     @patch('http.client.HTTPSConnection')
     def test_abort_before_execution(self, mock_conn_class):
@@ -80,30 +94,62 @@ class TestHTTPProcess(unittest.TestCase):
         self.assertEqual(len(task["errors"]), 1)
         self.assertIn("not valid JSON", task["errors"][0]["error"])
 
-    @patch('http.client.HTTPSConnection')
-    @patch('threading.Thread')
-    def test_run_async(self, mock_thread, mock_conn_class):
-        mock_conn = MagicMock()
-        mock_response = MagicMock()
-        mock_response.status = 200
-        mock_response.read.return_value = b'OK'
-        mock_conn.getresponse.return_value = mock_response
-        mock_conn_class.return_value = mock_conn
-
-        mock_thread_instance = MagicMock()
-        mock_thread.return_value = mock_thread_instance
-
+    @patch('task_executor.HTTPSConnection')
+    def test_run_async(self, mock_conn_class):
+        mock_conn_class.return_value = self._mock_connection()
+        workers = task_executor._DaemonWorkerPool(2, "test-http")
+        patcher = patch.object(task_executor, "_HTTP_WORKERS", workers)
+        patcher.start()
+        self.addCleanup(patcher.stop)
         config = {
             "method": "GET",
             "url": "https://<hostname>/api",
             "timeout": 30
         }
+        done = threading.Event()
+        threads = []
+
+        def on_request(*args, **kwargs):
+            threads.append(threading.current_thread())
+            done.set()
+        mock_conn_class.return_value.request.side_effect = on_request
+
+        for _ in range(2):
+            done.clear()
+            HTTPProcess(self.task_id, self.hostname, config, None, self.db).run_async()
+            self.assertTrue(done.wait(5))
+            # Wait for the worker to report back as idle before the next submission
+            for _ in range(500):
+                if workers._idle:
+                    break
+                time.sleep(0.001)
+
+        self.assertIsNot(threads[0], threading.current_thread())
+        self.assertIs(threads[0], threads[1])
+        self.assertTrue(threads[0].daemon)
+
+    @patch('task_executor.HTTPSConnection')
+    def test_job_aborted_while_queued_is_reported(self, mock_conn_class):
+        workers = task_executor._DaemonWorkerPool(1, "test-http")
+        patcher = patch.object(task_executor, "_HTTP_WORKERS", workers)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        release, done = threading.Event(), threading.Event()
+        # Occupy the only worker so the process stays queued
+        workers.submit(release.wait)
+        config = {"method": "GET", "url": "https://<hostname>/api", "timeout": 30}
 
         process = HTTPProcess(self.task_id, self.hostname, config, None, self.db)
         process.run_async()
+        process.abort()
+        workers.submit(done.set)
+        release.set()
+        self.assertTrue(done.wait(5))
 
-        mock_thread.assert_called_once()
-        mock_thread_instance.start.assert_called_once()
+        mock_conn_class.assert_not_called()
+        task = self.db[self.task_id]
+        self.assertEqual(task["running"], [])
+        self.assertEqual(task["errors"], [{"hostname": self.hostname, "error": "Task aborted"}])
 
     @patch('http.client.HTTPSConnection')
     def test_update_tasks_when_aborted(self, mock_conn_class):
@@ -121,6 +167,134 @@ class TestHTTPProcess(unittest.TestCase):
         self.assertEqual(len(task["errors"]), 1)
         self.assertEqual(task["errors"][0]["error"], "Task aborted")
 
+    @patch('task_executor.HTTPSConnection')
+    def test_keep_alive_connection_reused(self, mock_conn_class):
+        mock_conn = self._mock_connection()
+        mock_conn_class.return_value = mock_conn
+        config = {"method": "GET", "url": "https://<hostname>/api", "timeout": 30}
+
+        HTTPProcess(self.task_id, self.hostname, config, None, self.db).run_sync()
+        HTTPProcess(self.task_id, self.hostname, config, None, self.db).run_sync()
+
+        mock_conn_class.assert_called_once()
+        self.assertEqual(mock_conn.request.call_count, 2)
+        mock_conn.close.assert_not_called()
+        self.assertEqual(self.db[self.task_id]["success"][0]["output"], "OK")
+
+    @patch('task_executor.HTTPSConnection')
+    def test_closing_connection_not_pooled(self, mock_conn_class):
+        mock_conn_class.side_effect = [self._mock_connection(will_close=True), self._mock_connection(will_close=True)]
+        config = {"method": "GET", "url": "https://<hostname>/api", "timeout": 30}
+
+        HTTPProcess(self.task_id, self.hostname, config, None, self.db).run_sync()
+        HTTPProcess(self.task_id, self.hostname, config, None, self.db).run_sync()
+
+        self.assertEqual(mock_conn_class.call_count, 2)
+        self.assertFalse(task_executor._HTTP_POOL.get((True, self.hostname, False)))
+
+    @patch('task_executor.HTTPSConnection')
+    def test_stale_pooled_connection_retried_on_fresh_one(self, mock_conn_class):
+        stale_conn = self._mock_connection()
+        stale_conn.getresponse.side_effect = ConnectionResetError("Remote end closed connection")
+        fresh_conn = self._mock_connection()
+        mock_conn_class.return_value = fresh_conn
+        task_executor._HTTP_POOL[(True, self.hostname, False)] = [(stale_conn, time.monotonic())]
+        config = {"method": "GET", "url": "https://<hostname>/api", "timeout": 30}
+
+        HTTPProcess(self.task_id, self.hostname, config, None, self.db).run_sync()
+
+        stale_conn.close.assert_called_once()
+        mock_conn_class.assert_called_once()
+        task = self.db[self.task_id]
+        self.assertEqual(len(task["errors"]), 0)
+        self.assertEqual(task["success"][0]["response_code"], 200)
+
+    @patch('task_executor.HTTPSConnection')
+    def test_sent_post_not_resent_after_connection_drop(self, mock_conn_class):
+        stale_conn = self._mock_connection()
+        stale_conn.getresponse.side_effect = ConnectionResetError("Remote end closed connection")
+        task_executor._HTTP_POOL[(True, self.hostname, False)] = [(stale_conn, time.monotonic())]
+        config = {"method": "POST", "url": "https://<hostname>/api/shutdown", "timeout": 30}
+
+        HTTPProcess(self.task_id, self.hostname, config, None, self.db).run_sync()
+
+        stale_conn.request.assert_called_once()
+        mock_conn_class.assert_not_called()
+        task = self.db[self.task_id]
+        self.assertEqual(len(task["success"]), 0)
+        self.assertEqual(len(task["errors"]), 1)
+
+    @patch('task_executor.HTTPSConnection')
+    def test_post_not_resent_after_partial_write(self, mock_conn_class):
+        # Headers and body go out separately, so a failed write may still have reached the server
+        stale_conn = self._mock_connection()
+        stale_conn.request.side_effect = BrokenPipeError("Broken pipe")
+        task_executor._HTTP_POOL[(True, self.hostname, False)] = [(stale_conn, time.monotonic())]
+        config = {"method": "POST", "url": "https://<hostname>/api/shutdown", "timeout": 30}
+
+        HTTPProcess(self.task_id, self.hostname, config, None, self.db).run_sync()
+
+        mock_conn_class.assert_not_called()
+        self.assertEqual(len(self.db[self.task_id]["errors"]), 1)
+
+    @patch('task_executor.HTTPSConnection')
+    def test_expired_or_closed_idle_connections_not_reused(self, mock_conn_class):
+        fresh_conn = self._mock_connection()
+        mock_conn_class.return_value = fresh_conn
+        expired_conn, closed_conn = self._mock_connection(), self._mock_connection()
+        closed_conn.sock = None
+        task_executor._HTTP_POOL[(True, self.hostname, False)] = [
+            (expired_conn, time.monotonic() - task_executor._HTTP_POOL_MAX_IDLE_AGE - 1),
+            (closed_conn, time.monotonic()),
+        ]
+        config = {"method": "POST", "url": "https://<hostname>/api/shutdown", "timeout": 30}
+
+        HTTPProcess(self.task_id, self.hostname, config, None, self.db).run_sync()
+
+        expired_conn.request.assert_not_called()
+        closed_conn.request.assert_not_called()
+        expired_conn.close.assert_called_once()
+        fresh_conn.request.assert_called_once()
+        self.assertEqual(self.db[self.task_id]["success"][0]["response_code"], 200)
+
+
+class _IdleTimeoutHandler(BaseHTTPRequestHandler):
+    """Keep-alive handler that drops connections idle for more than timeout seconds, like Apache or nginx"""
+    protocol_version = "HTTP/1.1"
+    timeout = 0.2
+    posts = 0
+
+    def do_POST(self):
+        type(self).posts += 1
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"OK")
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHTTPProcessIdleTimeout(unittest.TestCase):
+    def setUp(self):
+        task_executor._HTTP_POOL.clear()
+        _IdleTimeoutHandler.posts = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _IdleTimeoutHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.db = OptionallyPersistentOrderedThreadSafeDict()
+
+    def test_post_after_server_idle_timeout(self):
+        config = {"method": "POST", "url": f"http://127.0.0.1:{self.server.server_port}/shutdown", "timeout": 5}
+        for i in range(2):
+            task_id = f"task-{i}"
+            self.db[task_id] = {"task_id": task_id, "success": [], "running": [{"hostname": "h"}], "errors": []}
+            HTTPProcess(task_id, "h", config, None, self.db).run_sync()
+            self.assertEqual(self.db[task_id]["errors"], [])
+            self.assertEqual(self.db[task_id]["success"][0]["response_code"], 200)
+            # Outlast the server's keep-alive timeout before the next task
+            time.sleep(0.5)
 
-if __name__ == '__main__':
-    unittest.main()
+        self.assertEqual(_IdleTimeoutHandler.posts, 2)
@@ -1,11 +1,7 @@
 import unittest
-import sys
-import os
+from unittest.mock import patch
 import json
 
-
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + '/concierge_acpi')
-
 from task_executor_helper import replace_json_placeholders
 
 class TestReplaceJsonPlaceholders(unittest.TestCase):
@@ -51,6 +47,13 @@ class TestReplaceJsonPlaceholders(unittest.TestCase):
             replace_json_placeholders(json_text, "host1", {"count": "abc"})
         self.assertIn("cannot be converted to number", str(context.exception))
 
+    def test_number_placeholder_rejects_non_finite(self):
+        json_text = '{"count": <number_count>}'
+        for value in ("1" + "0" * 400 + ".0", float("inf"), float("nan")):
+            with self.assertRaises(ValueError) as context:
+                replace_json_placeholders(json_text, "host1", {"count": value})
+            self.assertIn("cannot be converted to number", str(context.exception))
+
     def test_boolean_placeholder_true(self):
         json_text = '{"enabled": <boolean_enabled>}'
         result = replace_json_placeholders(json_text, "host1", {"enabled": True})
@@ -185,11 +188,42 @@ class TestReplaceJsonPlaceholders(unittest.TestCase):
             replace_json_placeholders(json_text, "host1", {"value": "test"})
         self.assertIn("not valid JSON", str(context.exception))
 
+    def test_valid_template_with_scalar_slots_not_reparsed(self):
+        json_text = '{"host": <string_hostname>, "count": <number_count>, "force": <boolean_force>}'
+        replace_json_placeholders(json_text, "host1", {"count": 1, "force": True})  # warm the template cache
+        with patch("task_executor_helper.json.loads", wraps=json.loads) as loads:
+            result = replace_json_placeholders(json_text, "host2", {"count": 2, "force": "no"})
+        loads.assert_not_called()
+        self.assertEqual(json.loads(result), {"host": "host2", "count": 2, "force": False})
+
+    def test_number_slot_next_to_token_chars_is_reparsed(self):
+        for json_text, value in (('{"a": -<number_n>}', -5), ('{"a": 1<number_n>}', "-2"), ('{"a": 0.<number_n>}', "1.5")):
+            with self.subTest(json_text=json_text):
+                with self.assertRaises(ValueError):
+                    replace_json_placeholders(json_text, "host1", {"n": value})
+
+    def test_template_with_json_slots_is_reparsed(self):
+        json_text = '{"config": <json_config>, "tags": <array_tags>}'
+        with patch("task_executor_helper.json.loads", wraps=json.loads) as loads:
+            result = replace_json_placeholders(json_text, "host1", {"config": {"k": "v"}, "tags": ["a"]})
+        loads.assert_called_with(result)
+        self.assertEqual(json.loads(result), {"config": {"k": "v"}, "tags": ["a"]})
+
+    def test_json_placeholder_inside_string_raises_error(self):
+        for value in ({"k": "v"}, '{"k":"v"}'):
+            with self.subTest(value=value):
+                with self.assertRaises(ValueError):
+                    replace_json_placeholders('{"a": "x <json_j>"}', "host1", {"j": value})
+
     def test_no_placeholders(self):
         json_text = '{"key": "value"}'
         result = replace_json_placeholders(json_text, "host1", {"unused": "param"})
         self.assertEqual(json.loads(result), json.loads(json_text))
 
+    def test_no_placeholders_invalid_json_raises_error(self):
+        with self.assertRaises(ValueError):
+            replace_json_placeholders('{"key": "<b>value</b>"', "host1", None)
+
     def test_missing_parameter(self):
         # Placeholder without corresponding parameter is left as-is
         json_text = '{"key": <string_value>}'
@@ -246,7 +280,3 @@ class TestReplaceJsonPlaceholders(unittest.TestCase):
         # Parameter is "Name" not "name"
         with self.assertRaises(ValueError):
             result = replace_json_placeholders(json_text, "host1", {"name": "test"})
-
-
-if __name__ == '__main__':
-    unittest.main()
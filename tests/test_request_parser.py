@@ -1,8 +1,4 @@
 import unittest
-import sys
-import os
-
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + '/concierge_acpi')
 
 from request_validator import RequestParser
 
@@ -70,7 +66,3 @@ class TestRequestParser(unittest.TestCase):
         path = "/concierge/api/v1/commands"
         with self.assertRaises(ValueError):
             RequestParser.parse_post_path(path)
-
-
-if __name__ == '__main__':
-    unittest.main()
@@ -1,20 +1,27 @@
 import unittest
 from unittest.mock import MagicMock, patch
-import sys
-import os
 import logging
-
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + '/concierge_acpi')
+import threading
 
 from persistent_dictionary import OptionallyPersistentOrderedThreadSafeDict
-from task_executor import TaskExecutor
+from task_executor import StreamableProcess, TaskExecutor
+
+
+class _LogSpy:
+    """Records log_callback calls without MagicMock's call-tracking machinery"""
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, *args):
+        self.calls.append(args)
+
 
 class TestTaskExecutor(unittest.TestCase):
     def setUp(self):
         self.db = OptionallyPersistentOrderedThreadSafeDict()
         self.processes = OptionallyPersistentOrderedThreadSafeDict()
         self.executor = TaskExecutor(self.db, self.processes)
-        self.log_callback = MagicMock()
+        self.log_callback = _LogSpy()
 
     def test_atomic_task_update(self):
         task_id = "test-task-123"
@@ -32,6 +39,7 @@ class TestTaskExecutor(unittest.TestCase):
         self.assertEqual(len(task["success"]), 1)
         self.assertEqual(len(task["running"]), 0)
         self.assertIn("end_timestamp", task)
+        self.assertIn(task_id, self.db._tagged_for_removal)
 
     def test_create_task(self):
         entries = {
@@ -72,7 +80,7 @@ class TestTaskExecutor(unittest.TestCase):
         task = self.db[task_id]
         self.assertIsNone(task["command"])
 
-    @patch('test_utils.send_wol')
+    @patch('task_executor.send_wol')
     def test_execute_task_calls_log_callback(self, mock_send_wol):
         entries = {
             "server1": ({"mac": "11:22:33:44:55:66"}, -1, False)
@@ -81,9 +89,45 @@ class TestTaskExecutor(unittest.TestCase):
         task_id = self.executor.create_task(None, entries)
         self.executor.execute_task(task_id, "wakeup", entries, None, self.log_callback)
 
-        self.log_callback.assert_called()
-        call_args = self.log_callback.call_args[0]
-        self.assertEqual(call_args[0], logging.INFO)
+        self.assertEqual(self.log_callback.calls, [(logging.INFO, "wakeup sent", "server1")])
+
+    def test_failed_hosts_stored_before_sync_command_runs(self):
+        entries = {
+            "server1": ({"command": "ping"}, 30, False),
+            "server2": ({"command": "ping"}, 30, True)
+        }
+        task_id = self.executor.create_task("status", entries)
+        running_during_sync = []
+
+        def run_sync(task_id, hostname, *args):
+            running_during_sync.extend(self.db[task_id]["running"])
+
+        with patch.object(self.executor, "execute_shell_async", side_effect=RuntimeError("spawn failed")), \
+                patch.object(self.executor, "execute_shell_sync", side_effect=run_sync):
+            self.executor.execute_task(task_id, "command", entries, None, self.log_callback)
+
+        self.assertEqual(running_during_sync, [{"hostname": "server2"}])
+        self.assertEqual(self.db[task_id]["errors"], [{"hostname": "server1", "error": "spawn failed"}])
+
+    @patch('task_executor.send_wol')
+    def test_execute_wakeup_task_stored_in_one_write(self, mock_send_wol):
+        mock_send_wol.side_effect = [None, ValueError("Invalid MAC address: bad"), None]
+        entries = {
+            "server1": ({"mac": "11:22:33:44:55:66"}, -1, False),
+            "server2": ({"mac": "bad"}, -1, False),
+            "server3": ({"mac": "11:22:33:44:55:77"}, -1, False)
+        }
+
+        task_id = self.executor.create_task(None, entries)
+        with patch.object(self.db, "transaction", wraps=self.db.transaction) as transaction:
+            self.executor.execute_task(task_id, "wakeup", entries, None, self.log_callback)
+
+        transaction.assert_called_once_with(task_id)
+        task = self.db[task_id]
+        self.assertEqual(task["success"], [{"hostname": "server1"}, {"hostname": "server3"}])
+        self.assertEqual(task["errors"], [{"hostname": "server2", "error": "Invalid MAC address: bad"}])
+        self.assertEqual(task["running"], [])
+        self.assertIn(task_id, self.db._tagged_for_removal)
 
     def test_execute_task_with_exception(self):
         entries = {
@@ -99,5 +143,28 @@ class TestTaskExecutor(unittest.TestCase):
         self.assertEqual(len(task["errors"]), 1)
 
 
-if __name__ == '__main__':
-    unittest.main()
+class TestStreamableProcess(unittest.TestCase):
+    def test_status_broadcast_outside_db_lock(self):
+        db = OptionallyPersistentOrderedThreadSafeDict()
+        db["task-1"] = {"task_id": "task-1", "success": [], "running": [{"hostname": "server1"}], "errors": []}
+        lock_free = []
+
+        def probe_lock():
+            acquired = db.lock.acquire(timeout=1)
+            if acquired:
+                db.lock.release()
+            lock_free.append(acquired)
+
+        def broadcast_status(*args):
+            # Another thread can only take the lock if this one released it
+            probe = threading.Thread(target=probe_lock)
+            probe.start()
+            probe.join()
+        ws_manager = MagicMock()
+        ws_manager.broadcast_status.side_effect = broadcast_status
+
+        StreamableProcess("task-1", "server1", "true", [], db, ws_manager, {})._update_task(error="boom")
+
+        ws_manager.broadcast_status.assert_called_once_with("task-1", "server1", "error")
+        self.assertEqual(lock_free, [True])
+        self.assertEqual(db["task-1"]["errors"], [{"hostname": "server1", "error": "boom"}])
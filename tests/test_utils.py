@@ -1,11 +1,9 @@
 import unittest
+import socket
 from unittest.mock import patch, MagicMock
-import sys
-import os
 
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + '/concierge_acpi')
-
-from task_executor_helper import replace_placeholders, send_wol
+import task_executor_helper
+from task_executor_helper import remove_running_host, replace_placeholders, send_wol
 
 class TestReplacePlaceholders(unittest.TestCase):
     def test_replace_hostname_only(self):
@@ -42,12 +40,39 @@ class TestReplacePlaceholders(unittest.TestCase):
         result = replace_placeholders("host:<port>,enabled=<enabled>", "srv", params)
         self.assertEqual(result, "host:8080,enabled=True")
 
+    def test_unknown_placeholder_kept(self):
+        result = replace_placeholders("<hostname>:<missing>", "srv", {"port": 80})
+        self.assertEqual(result, "srv:<missing>")
+
+    def test_param_values_not_expanded(self):
+        result = replace_placeholders("<a>-<b>", "srv", {"a": "<b>", "b": "x"})
+        self.assertEqual(result, "<b>-x")
+
+
+class TestRemoveRunningHost(unittest.TestCase):
+    def test_removes_first_matching_entry_only(self):
+        running = [{"hostname": "a"}, {"hostname": "b"}, {"hostname": "b"}]
+        remove_running_host(running, "b")
+        self.assertEqual(running, [{"hostname": "a"}, {"hostname": "b"}])
+
+    def test_ignores_missing_and_non_plain_entries(self):
+        running = [{"hostname": "a", "error": "x"}]
+        remove_running_host(running, "a")
+        remove_running_host(running, "z")
+        self.assertEqual(running, [{"hostname": "a", "error": "x"}])
+
 
 class TestSendWol(unittest.TestCase):
+    def setUp(self):
+        task_executor_helper._WOL_SOCK = None
+
+    def tearDown(self):
+        task_executor_helper._WOL_SOCK = None
+
     @patch('socket.socket')
     def test_send_wol_with_colons(self, mock_socket):
         mock_sock = MagicMock()
-        mock_socket.return_value.__enter__.return_value = mock_sock
+        mock_socket.return_value = mock_sock
         
         send_wol("11:22:33:44:55:66")
         
@@ -67,7 +92,7 @@ class TestSendWol(unittest.TestCase):
     @patch('socket.socket')
     def test_send_wol_with_dashes(self, mock_socket):
         mock_sock = MagicMock()
-        mock_socket.return_value.__enter__.return_value = mock_sock
+        mock_socket.return_value = mock_sock
         
         send_wol("11-22-33-44-55-66")
         
@@ -79,7 +104,7 @@ class TestSendWol(unittest.TestCase):
     @patch('socket.socket')
     def test_send_wol_broadcast_address(self, mock_socket):
         mock_sock = MagicMock()
-        mock_socket.return_value.__enter__.return_value = mock_sock
+        mock_socket.return_value = mock_sock
         
         send_wol("AA:BB:CC:DD:EE:FF")
         
@@ -87,6 +112,49 @@ class TestSendWol(unittest.TestCase):
         address = call_args[1]
         self.assertEqual(address, ("255.255.255.255", 9))
 
+    @patch('socket.socket')
+    def test_send_wol_reuses_broadcast_socket(self, mock_socket):
+        mock_sock = MagicMock()
+        mock_socket.return_value = mock_sock
+
+        send_wol("11:22:33:44:55:66")
+        send_wol("AA:BB:CC:DD:EE:FF")
+
+        mock_socket.assert_called_once_with(socket.AF_INET, socket.SOCK_DGRAM)
+        mock_sock.setsockopt.assert_called_once_with(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        self.assertEqual(mock_sock.sendto.call_count, 2)
+        mock_sock.close.assert_not_called()
+
+    @patch('socket.socket')
+    def test_send_wol_reopens_socket_after_send_error(self, mock_socket):
+        broken_sock, fresh_sock = MagicMock(), MagicMock()
+        broken_sock.sendto.side_effect = OSError("Network is unreachable")
+        mock_socket.side_effect = [broken_sock, fresh_sock]
+
+        with self.assertRaises(OSError):
+            send_wol("11:22:33:44:55:66")
+        send_wol("11:22:33:44:55:66")
+
+        broken_sock.close.assert_called_once()
+        fresh_sock.sendto.assert_called_once()
+
+    @patch('socket.socket')
+    def test_send_wol_rejects_wrong_length_mac(self, mock_socket):
+        with self.assertRaises(ValueError):
+            send_wol("AA:BB:CC:DD:EE")
+        with self.assertRaises(ValueError):
+            send_wol("AA BB CC DD EE FF")
+
+        mock_socket.assert_not_called()
+
+    @patch('socket.socket')
+    def test_send_wol_builds_packet_once_per_mac(self, mock_socket):
+        mock_sock = MagicMock()
+        mock_socket.return_value = mock_sock
+
+        send_wol("11:22:33:44:55:66")
+        send_wol("11:22:33:44:55:66")
 
-if __name__ == '__main__':
-    unittest.main()
+        first, second = (c[0][0] for c in mock_sock.sendto.call_args_list)
+        self.assertIs(first, second)
+        self.assertEqual(first, b"\xff" * 6 + bytes.fromhex("112233445566") * 16)